@@ -0,0 +1,136 @@
+"""Finds dictionary entries in running text with an Aho-Corasick automaton over lexicon.db."""
+from collections import deque
+import argparse
+import pickle
+import sqlite3
+from pathlib import Path
+
+# Transitions are stored in one dict keyed by (state << CODE_BITS) | ord(char)
+CODE_BITS = 21
+
+
+class Analyzer:
+    """Matches every headword, variant and conjugated form of lexicon.db in a single pass over a text."""
+
+    def __init__(self, patterns: dict, vocabulary_levels: dict):
+        """patterns maps a surface form to the ids of the entries it belongs to."""
+        self.vocabulary_levels = vocabulary_levels
+        self.patterns = []
+        self.transitions = {}
+        children = [[]]
+        ends = {}
+        for text, ids in patterns.items():
+            if not text:
+                continue
+            state = 0
+            for c in text:
+                key = (state << CODE_BITS) | ord(c)
+                child = self.transitions.get(key)
+                if child is None:
+                    child = len(children)
+                    children.append([])
+                    children[state].append((ord(c), child))
+                    self.transitions[key] = child
+                state = child
+            ends[state] = len(self.patterns)
+            self.patterns.append((len(text), tuple(sorted(ids))))
+
+        # breadth first, so the fail state of a state is always done before the state itself
+        self.fail = [0] * len(children)
+        self.outputs = {}
+        queue = deque(child for _, child in children[0])
+        while queue:
+            state = queue.popleft()
+            found = ((ends[state],) if state in ends else ()) + self.outputs.get(self.fail[state], ())
+            if found:
+                self.outputs[state] = found
+            for code, child in children[state]:
+                fail = self.fail[state]
+                while True:
+                    target = self.transitions.get((fail << CODE_BITS) | code)
+                    if target is not None:
+                        self.fail[child] = target
+                        break
+                    if fail == 0:
+                        break
+                    fail = self.fail[fail]
+                queue.append(child)
+
+    @classmethod
+    def from_db(cls, conn):
+        patterns = {}
+        for text, id in conn.execute("""
+            SELECT written_form, id FROM lexical_entries
+            UNION SELECT variant, lexical_entry_id FROM variants
+            UNION SELECT written_form, lexical_entry_id FROM word_forms
+                WHERE type_of_form = 'Conjugation' AND written_form IS NOT NULL
+        """):
+            patterns.setdefault(text, set()).add(id)
+        vocabulary_levels = dict(conn.execute("SELECT id, vocabulary_level FROM lexical_entries"))
+        return cls(patterns, vocabulary_levels)
+
+    def find(self, text: str):
+        """Yield (start, end, entry ids) for every occurrence of a known form in text, overlapping ones included."""
+        transitions, fail, outputs, patterns = self.transitions, self.fail, self.outputs, self.patterns
+        state = 0
+        for i, c in enumerate(text):
+            code = ord(c)
+            while True:
+                target = transitions.get((state << CODE_BITS) | code)
+                if target is not None:
+                    state = target
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+            found = outputs.get(state)
+            if found:
+                for pattern in found:
+                    length, ids = patterns[pattern]
+                    yield i + 1 - length, i + 1, ids
+
+    def annotate(self, text: str):
+        """The matches of find with their text and the vocabulary level of every entry."""
+        return [
+            {
+                "start": start,
+                "end": end,
+                "text": text[start:end],
+                "entries": [{"id": id, "vocabulary_level": self.vocabulary_levels.get(id)} for id in ids],
+            }
+            for start, end, ids in self.find(text)
+        ]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path) -> "Analyzer":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the text analyzer from lexicon.db, or annotate text files with it.")
+    parser.add_argument("files", nargs="*", type=Path, help="text files to annotate")
+    parser.add_argument("--analyzer", type=Path, default=Path("analyzer.pickle"),
+                        help="where the built analyzer is stored")
+    args = parser.parse_args()
+
+    if args.analyzer.exists() and args.files:
+        analyzer = Analyzer.load(args.analyzer)
+    else:
+        analyzer = Analyzer.from_db(sqlite3.connect("lexicon.db"))
+        analyzer.save(args.analyzer)
+        print(f"Saved {len(analyzer.patterns)} forms to {args.analyzer}")
+
+    for path in args.files:
+        text = path.read_text(encoding="utf-8")
+        for start, end, ids in analyzer.find(text):
+            levels = ",".join(str(analyzer.vocabulary_levels.get(id)) for id in ids)
+            print(f"{path}\t{start}\t{end}\t{text[start:end]}\t{','.join(map(str, ids))}\t{levels}")
+
+
+if __name__ == "__main__":
+    main()
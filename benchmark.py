@@ -0,0 +1,193 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import multiprocessing
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+
+from db import IdAllocator, add_file_to_db, create_indexes, init_db, simplified_files
+from query import fetch_entries
+from simplify import entry_lines_path, simplify_file, simplify_file_streaming
+from synthetic import ENTRIES_PER_FILE, generate_export
+
+# Small page cache for the read benchmark, so entries spread over many pages have to be read again
+READ_CACHE_PAGES = 64
+
+
+def build(db_path, json_files, raw=False, clustered=False, indexes=True):
+    """Build a database like db.py does and return the seconds it took."""
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    init_db(conn, clustered=clustered)
+    ids = IdAllocator()
+    for json_file in json_files:
+        add_file_to_db(conn, json_file, ids, raw)
+    if indexes:
+        create_indexes(conn)
+    conn.close()
+    return time.perf_counter() - start
+
+
+def index(db_path):
+    conn = sqlite3.connect(db_path)
+    create_indexes(conn)
+    conn.close()
+
+
+def simplify_files(json_files, out_dir, stream=False, lines=False):
+    out_dir.mkdir(exist_ok=True)
+    for json_file in json_files:
+        if stream:
+            simplify_file_streaming(json_file, out_dir, lines=lines)
+        else:
+            simplify_file(json_file, out_dir, lines=lines)
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes."""
+    # getrusage keeps the peak of the parent across fork and exec, the high water mark of /proc does not
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(function, *args):
+    """Run function in this process and return its seconds and the peak RSS of the process."""
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start, peak_rss()
+
+
+def run_phase(function, *args):
+    # a fresh process per phase, so the peak RSS belongs to that phase alone
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(measure, function, *args).result()
+
+
+def count_entries(db_path) -> int:
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT (SELECT COUNT(*) FROM lexical_entries) + (SELECT COUNT(*) FROM phrase_proverbs)").fetchone()[0]
+    conn.close()
+    return count
+
+
+def run_phases(data_dir, work_dir):
+    """Time the preprocessing and build phases on the export in data_dir, writing everything to work_dir."""
+    json_files = sorted(Path(data_dir).glob("*.json"))
+    simplified_dir = work_dir / "simplified"
+    lines_dir = work_dir / "simplified-jsonl"
+    db_path = work_dir / "lexicon.db"
+    raw_db_path = work_dir / "lexicon-raw.db"
+    lines_db_path = work_dir / "lexicon-jsonl.db"
+    phases = [
+        ("simplify", simplify_files, (json_files, simplified_dir), None),
+        ("simplify --stream", simplify_files, (json_files, work_dir / "simplified-stream", True), None),
+        ("simplify --jsonl", simplify_files, (json_files, lines_dir, True, True), None),
+        ("db", build, (db_path, [simplified_dir / json_file.name for json_file in json_files], False, False, False),
+         db_path),
+        ("db from jsonl", build, (lines_db_path, [entry_lines_path(lines_dir, json_file) for json_file in json_files],
+                                  False, False, False), lines_db_path),
+        ("db --raw", build, (raw_db_path, json_files, True, False, False), raw_db_path),
+        ("indexes", index, (db_path,), db_path),
+    ]
+    results = {}
+    for name, function, args, output in phases:
+        print(f"Running {name}...")
+        seconds, rss = run_phase(function, *args)
+        results[name] = {
+            "seconds": seconds,
+            "peak_rss_bytes": rss,
+            "db_size_bytes": output.stat().st_size if output is not None else None,
+        }
+    entries = count_entries(db_path)
+    for result in results.values():
+        result["entries_per_second"] = entries / result["seconds"] if result["seconds"] else float("inf")
+    return entries, results
+
+
+def read_entries(db_path, ids):
+    """Assemble the entries one at a time and return the entries per second."""
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA cache_size = {READ_CACHE_PAGES}")
+    start = time.perf_counter()
+    for id in ids:
+        fetch_entries(conn, [id])
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return len(ids) / elapsed if elapsed else float("inf")
+
+
+def compare_layouts(json_files, raw=False, sample: int = 10000, seed: int = 0):
+    """Build the default and the --clustered schema from the same files and compare size and read speed."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="lexicon-bench-", dir=".") as bench_dir:
+        for layout, clustered in (("rowid", False), ("clustered", True)):
+            db_path = Path(bench_dir) / f"{layout}.db"
+            seconds = build(db_path, json_files, raw, clustered)
+            conn = sqlite3.connect(db_path)
+            ids = [id for (id,) in conn.execute("SELECT id FROM lexical_entries ORDER BY id")]
+            conn.close()
+            ids = random.Random(seed).sample(ids, min(sample, len(ids)))
+            results[layout] = {
+                "build_seconds": seconds,
+                "size_bytes": db_path.stat().st_size,
+                "entries_per_second": read_entries(db_path, ids),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark simplifying the export and building lexicon.db.")
+    parser.add_argument("--synthetic", type=int, metavar="ENTRIES",
+                        help="benchmark a generated export of this many entries instead of data/")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the generated export")
+    parser.add_argument("--layouts", action="store_true",
+                        help="compare the default and the --clustered schema instead of timing the phases")
+    parser.add_argument("--raw", action="store_true",
+                        help="with --layouts, build from the raw export instead of simplified/")
+    parser.add_argument("--sample", type=int, default=10000,
+                        help="number of random entries assembled in the --layouts read benchmark")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="lexicon-bench-", dir=".") as work_dir:
+        work_dir = Path(work_dir)
+        data_dir = Path("data")
+        if args.synthetic:
+            data_dir = work_dir / "data"
+            seconds, rss = run_phase(generate_export, data_dir, args.synthetic, ENTRIES_PER_FILE, args.seed)
+            print(f"Generated {args.synthetic} entries in {seconds:.2f}s, peak RSS {rss / 1e6:.1f} MB")
+
+        if args.layouts:
+            if args.synthetic:
+                json_files = sorted(data_dir.glob("*.json"))
+                args.raw = True
+            else:
+                json_files = sorted(Path('data').glob("*.json")) if args.raw else simplified_files("simplified")
+            results = compare_layouts(json_files, args.raw, args.sample)
+            print(f"{'layout':<12}{'build s':>10}{'size MB':>10}{'entries/s':>12}")
+            for layout, result in results.items():
+                print(f"{layout:<12}{result['build_seconds']:>10.2f}{result['size_bytes'] / 1e6:>10.1f}"
+                      f"{result['entries_per_second']:>12.0f}")
+            return
+
+        entries, results = run_phases(data_dir, work_dir)
+    print(f"{entries} entries")
+    print(f"{'phase':<20}{'s':>10}{'entries/s':>12}{'peak RSS MB':>14}{'db MB':>10}")
+    for name, result in results.items():
+        size = f"{result['db_size_bytes'] / 1e6:.1f}" if result["db_size_bytes"] is not None else "-"
+        print(f"{name:<20}{result['seconds']:>10.2f}{result['entries_per_second']:>12.0f}"
+              f"{result['peak_rss_bytes'] / 1e6:>14.1f}{size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,128 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import hashlib
+import os
+import re
 import sqlite3
+import tempfile
+import time
 from typing import Optional
 from pathlib import Path
 import json
 
-def init_db(conn):
+from simplify import SHAPES_FILE, iter_entry_lines, iter_simplified_entries, normalized_files
+from query import fetch_entries
+import hangul
+from normalize import split_terms
+from report import NO_REPORT, BuildReport, timed
+
+# Rows buffered per insert statement before they are written with executemany
+BATCH_SIZE = 1000
+
+# Surrogate key of every table whose ids are assigned by IdAllocator
+ID_COLUMNS = {
+    "subject_categories": "id",
+    "phrase_proverbs": "pk",
+    "equivalents": "id",
+    "semantic_categories": "id",
+    "word_forms": "id",
+    "form_representations": "id",
+    "senses": "id",
+    "sense_examples": "id",
+    "sense_relations": "id",
+    "syntactic_patterns": "id",
+    "multimedia": "id",
+    "variants": "id",
+}
+
+# Columns holding ids assigned by IdAllocator in another table
+ID_REFERENCES = {
+    "form_representations": {"word_form_id": "word_forms"},
+    "sense_examples": {"sense_id": "senses"},
+    "sense_relations": {"sense_id": "senses"},
+    "syntactic_patterns": {"sense_id": "senses"},
+    "equivalents": {"sense_id": "senses"},
+    "multimedia": {"sense_id": "senses"},
+    "equivalent_terms": {"sense_id": "senses", "equivalent_id": "equivalents"},
+}
+
+TABLES = ("lexical_entries", *ID_COLUMNS, "equivalent_terms", "source_files", "entry_hashes")
+
+# Secondary indexes, created once the tables are loaded
+INDEXES = {
+    "lexical_entries_written_form": "lexical_entries(written_form)",
+    "phrase_proverbs_id": "phrase_proverbs(id)",
+    "phrase_proverbs_written_form": "phrase_proverbs(written_form)",
+    "subject_categories_lexical_entry_id": "subject_categories(lexical_entry_id)",
+    "equivalents_lexical_entry_id": "equivalents(lexical_entry_id)",
+    "equivalents_sense_id": "equivalents(sense_id)",
+    "equivalents_language_lemma": "equivalents(language, lemma)",
+    "semantic_categories_lexical_entry_id": "semantic_categories(lexical_entry_id)",
+    "word_forms_lexical_entry_id": "word_forms(lexical_entry_id)",
+    "form_representations_word_form_id": "form_representations(word_form_id)",
+    "senses_lexical_entry_id": "senses(lexical_entry_id)",
+    "sense_examples_sense_id": "sense_examples(sense_id)",
+    "sense_relations_sense_id": "sense_relations(sense_id)",
+    "sense_relations_lexical_entry_id": "sense_relations(lexical_entry_id)",
+    "syntactic_patterns_sense_id": "syntactic_patterns(sense_id)",
+    "multimedia_sense_id": "multimedia(sense_id)",
+    "variants_variant": "variants(variant, lexical_entry_id)",
+    "variants_lexical_entry_id": "variants(lexical_entry_id)",
+    "variants_jamo": "variants(jamo)",
+    "variants_choseong": "variants(choseong)",
+    "entry_hashes_file": "entry_hashes(file)",
+    "equivalent_terms_language_term": "equivalent_terms(language, term, lexical_entry_id)",
+    "equivalent_terms_lexical_entry_id": "equivalent_terms(lexical_entry_id)",
+}
+
+# Primary keys of the --clustered profile, the rows of a parent are stored next to each other.
+# Ids are allocated in input order, so the id orders the children of a parent.
+CLUSTERED_KEYS = {
+    "subject_categories": ("lexical_entry_id", "id"),
+    "semantic_categories": ("lexical_entry_id", "id"),
+    "variants": ("lexical_entry_id", "id"),
+    "word_forms": ("lexical_entry_id", "id"),
+    "form_representations": ("word_form_id", "id"),
+    "senses": ("lexical_entry_id", "id"),
+    "equivalents": ("lexical_entry_id", "id"),
+    "sense_examples": ("sense_id", "id"),
+    "sense_relations": ("sense_id", "id"),
+    "syntactic_patterns": ("sense_id", "id"),
+    "multimedia": ("sense_id", "id"),
+}
+
+# Parents are still looked up by id alone, which the rowid did before
+CLUSTERED_INDEXES = {
+    "senses_id": "senses(id)",
+    "word_forms_id": "word_forms(id)",
+}
+
+# Settings for writing a fresh database nobody reads yet, a crash only loses the temporary file
+BULK_LOAD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "cache_size": -256 * 1024,
+    "temp_store": "MEMORY",
+    "locking_mode": "EXCLUSIVE",
+    "foreign_keys": "OFF",
+}
+
+
+def init_db(conn, drop: bool = True, clustered: bool = False):
     # Connect to SQLite (or create db file)
     cursor = conn.cursor()
 
-    # Create tables with corrected SQLite syntax
-    cursor.executescript(
-    """
+    if drop:
+        # views of an --enum-codes database stand in for tables and are dropped first
+        for (name,) in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'view'").fetchall():
+            cursor.execute(f"DROP VIEW {name}")
+        for table in ENUM_COLUMNS:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}_coded")
+        for enum in ENUMS:
+            cursor.execute(f"DROP TABLE IF EXISTS enum_{enum}")
+        cursor.executescript(
+        """
     DROP TABLE IF EXISTS lexical_entries;
     DROP TABLE IF EXISTS semantic_categories;
     DROP TABLE IF EXISTS word_forms;
@@ -23,7 +136,21 @@ def init_db(conn):
     DROP TABLE IF EXISTS multimedia;
     drop table if exists variants;
     drop table if exists subject_categories;
-                         
+    drop table if exists meaning_fts;
+    drop table if exists substring_fts;
+    drop table if exists substring_grams;
+    drop table if exists source_files;
+    drop table if exists entry_hashes;
+    drop table if exists pending_entries;
+    drop table if exists equivalent_terms;
+    drop table if exists relation_edges;
+    drop table if exists relation_clusters;
+    drop table if exists entry_documents;
+        """)
+
+    # Create tables with corrected SQLite syntax
+    cursor.executescript(
+    """
     CREATE TABLE IF NOT EXISTS lexical_entries (
         id INTEGER PRIMARY KEY NOT NULL,
         part_of_speech TEXT NOT NULL,
@@ -121,11 +248,39 @@ def init_db(conn):
     create table if not exists variants (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         lexical_entry_id INTEGER NOT NULL,
-        variant TEXT NOT NULL
+        variant TEXT NOT NULL,
+        jamo TEXT NOT NULL,
+        choseong TEXT NOT NULL
+    );
+
+    create table if not exists equivalent_terms (
+        term TEXT NOT NULL,
+        language TEXT NOT NULL,
+        lexical_entry_id INTEGER NOT NULL,
+        sense_id INTEGER NOT NULL,
+        equivalent_id INTEGER NOT NULL
+    );
+
+    create table if not exists source_files (
+        name TEXT PRIMARY KEY NOT NULL,
+        hash TEXT NOT NULL
+    );
+
+    create table if not exists entry_hashes (
+        lexical_entry_id INTEGER PRIMARY KEY NOT NULL,
+        file TEXT NOT NULL,
+        hash TEXT NOT NULL
+    );
+
+    -- entries changed by an incremental run whose derived tables are not rebuilt yet
+    create table if not exists pending_entries (
+        lexical_entry_id INTEGER PRIMARY KEY NOT NULL
     );
     """)
 
     conn.commit()
+    if clustered:
+        cluster_tables(conn)
 
 language_map = {
     "인도네시아어": "Indonesian",
@@ -441,14 +596,92 @@ subject_category_map = {
     "환경 문제": "Environmental Issues"
 }
 
+# Maps whose labels --enum-codes stores as integer codes, the code of a label is its position in the map
+ENUMS = {
+    "pos": pos_map,
+    "type": type_map,
+    "language": language_map,
+    "lexical_unit": lexical_unit_map,
+    "vocab_level": vocab_level_map,
+    "semantic_category": semantic_category_map,
+    "subject_category": subject_category_map,
+}
+
+ENUM_COLUMNS = {
+    "lexical_entries": {"part_of_speech": "pos", "lexical_unit": "lexical_unit", "vocabulary_level": "vocab_level"},
+    "phrase_proverbs": {"lexical_unit": "lexical_unit"},
+    "subject_categories": {"name": "subject_category"},
+    "equivalents": {"language": "language"},
+    "equivalent_terms": {"language": "language"},
+    "semantic_categories": {"base": "semantic_category", "detail": "semantic_category"},
+    "word_forms": {"type_of_form": "type"},
+    "form_representations": {"type_of_form": "type"},
+    "sense_examples": {"type_of_example": "type"},
+    "sense_relations": {"type_of_relation": "type"},
+    "multimedia": {"type_of_media": "type"},
+}
+
+
+class BatchCursor:
+    """Stands in for a cursor in the insert_* helpers, buffering rows per statement for executemany."""
+
+    def __init__(self, cursor, batch_size: int = BATCH_SIZE):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        # statements that only differ in whitespace share a buffer to keep the row order of their table
+        self.buffers = {}
+        self.pending = {}
+        # rows written per table
+        self.written = Counter()
+
+    def execute(self, sql, parameters=()):
+        rows = self.pending.get(sql)
+        if rows is None:
+            rows = self.pending[sql] = self.buffers.setdefault(" ".join(sql.split()), [])
+        rows.append(parameters)
+        if len(rows) >= self.batch_size:
+            self.write(sql, rows)
+
+    def write(self, sql, rows):
+        self.cursor.executemany(sql, rows)
+        self.written[re.search(r"into\s+(\w+)", sql, re.IGNORECASE).group(1)] += len(rows)
+        rows.clear()
+
+    def flush(self):
+        for sql, rows in self.buffers.items():
+            if rows:
+                self.write(sql, rows)
+
+
+class IdAllocator:
+    """Hands out row ids per table in input order, so rows can be written without asking SQLite for them."""
+
+    def __init__(self, start: int = 1):
+        self.start = start
+        self.next_ids = {}
+
+    @classmethod
+    def from_db(cls, conn):
+        """Continue after the highest ids already in the database."""
+        ids = cls()
+        for table, column in ID_COLUMNS.items():
+            ids.next_ids[table] = (conn.execute(f"SELECT MAX({column}) FROM {table}").fetchone()[0] or 0) + 1
+        return ids
+
+    def take(self, table: str, count: int = 1) -> int:
+        """Reserve count consecutive ids in table and return the first one."""
+        id = self.next_ids.get(table, self.start)
+        self.next_ids[table] = id + count
+        return id
+
 
 # Insertion functions (with optional ID specification)
 def insert_subject_category(
-        cursor, name: str, lexical_entry_id: int):
+        cursor, name: str, lexical_entry_id: int, id: Optional[int] = None):
     cursor.execute("""
-        INSERT INTO subject_categories (name, lexical_entry_id)
-        VALUES (?, ?)
-    """, (subject_category_map[name.strip()], lexical_entry_id))
+        INSERT INTO subject_categories (id, name, lexical_entry_id)
+        VALUES (?, ?, ?)
+    """, (id, subject_category_map[name.strip()], lexical_entry_id))
 
 def insert_equivalent(
         cursor, language, lemma, definition, lexical_id: int = None,
@@ -458,20 +691,26 @@ def insert_equivalent(
         INSERT INTO equivalents (id, lexical_entry_id, sense_id, language, lemma, definition)
         VALUES (?, ?, ?, ?, ?, ?)
     """, (id, lexical_id, sense_id, language_map[language], lemma, definition))
+    # reverse index for looking up Korean entries by their translation
+    for term in split_terms(lemma):
+        cursor.execute("""
+            INSERT INTO equivalent_terms (term, language, lexical_entry_id, sense_id, equivalent_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, (term, language_map[language], lexical_id, sense_id, id))
 
 def insert_lexical_entry(
         cursor,
     part_of_speech: str, written_form: str, homonym_number: int,
     lexical_unit: str,
     vocabulary_level: Optional[str] = None, 
-    id: Optional[int] = None
+    id: Optional[int] = None, pk: Optional[int] = None
 ):
     #print(f"Inserting {(id, part_of_speech, written_form, homonym_number, lexical_unit, vocabulary_level)=}")
     if part_of_speech == "":
         cursor.execute("""
-                       insert into phrase_proverbs (id, written_form, lexical_unit)
-                       values (?, ?, ?)
-                       """, (id, written_form, lexical_unit_map[lexical_unit]))
+                       insert into phrase_proverbs (pk, id, written_form, lexical_unit)
+                       values (?, ?, ?, ?)
+                       """, (pk, id, written_form, lexical_unit_map[lexical_unit]))
     else:
         cursor.execute("""
             INSERT INTO lexical_entries (id, part_of_speech, written_form,
@@ -585,58 +824,65 @@ def insert_multimedia(cursor, sense_id: int, type: str, label: str, url: str, id
         VALUES (?, ?, ?, ?, ?)
     """, (id, sense_id, type_map[type], label, url))
 
-def insert_variant(cursor, lexical_entry_id: int, variant: str):
+def insert_variant(cursor, lexical_entry_id: int, variant: str, id: Optional[int] = None):
     cursor.execute("""
-        INSERT INTO variants (lexical_entry_id, variant)
-        VALUES (?, ?)
-    """, (lexical_entry_id, variant))
+        INSERT INTO variants (id, lexical_entry_id, variant, jamo, choseong)
+        VALUES (?, ?, ?, ?, ?)
+    """, (id, lexical_entry_id, variant, hangul.decompose(variant), hangul.choseong(variant)))
 
-conn = sqlite3.connect("lexicon.db")
-init_db(conn)
+# A word form without pronunciation still gets its row
+NO_PRONUNCIATION = (None,)
 
 
-def add_semantic_categories(cursor, semantic_categories, id):
+def add_semantic_categories(cursor, semantic_categories, id, ids):
     if isinstance(semantic_categories, str):
         semantic_categories = [semantic_categories]
     for category in semantic_categories:
-        insert_semantic_category(cursor, id, category)
+        insert_semantic_category(cursor, id, category, id=ids.take("semantic_categories"))
 
 
-def add_word_forms(cursor, word_forms, id):
+def add_word_forms(cursor, word_forms, id, ids):
     if isinstance(word_forms, dict):
         word_forms = [word_forms]
     for form in word_forms:
+        pronunciation = form.get("pronunciation", None)
+        # one row per pronunciation
+        word_form_id = ids.take("word_forms", len(pronunciation) if isinstance(pronunciation, list) else 1)
         insert_word_form(
             cursor,
             lexical_entry_id=id,
             type_of_form=form.get("type", ""),
             written_form=form.get("writtenForm", None),
-            pronunciation=form.get("pronunciation", None),
-            sound=form.get("sound", None)
+            pronunciation=pronunciation,
+            sound=form.get("sound", None),
+            id=word_form_id
         )
         if "FormRepresentation" in form:
             representation = form["FormRepresentation"]
+            pronunciation = representation.get("pronunciation", None)
             insert_form_representation(
                 cursor,
-                word_form_id=id,
+                word_form_id=word_form_id,
                 type_of_form=representation.get("type", ""),
                 written_form=representation.get("writtenForm", ""),
-                pronunciation=representation.get("pronunciation", None),
-                sound=representation.get("sound", None)
+                pronunciation=pronunciation,
+                sound=representation.get("sound", None),
+                id=ids.take("form_representations", len(pronunciation) if isinstance(pronunciation, list) else 1)
             )
 
-def add_senses(cursor, senses, lexical_entry_id):
+def add_senses(cursor, senses, lexical_entry_id, ids):
     if isinstance(senses, dict):
         senses = [senses]
     for sense in senses:
+        sense_id = ids.take("senses")
         insert_sense(
             cursor,
             lexical_entry_id=lexical_entry_id,
             definition=sense.get("definition", ""),
             annotation=sense.get("annotation", None),
-            syntactic_annotation=sense.get("syntacticAnnotation", None)
+            syntactic_annotation=sense.get("syntacticAnnotation", None),
+            id=sense_id
         )
-        sense_id = cursor.lastrowid
         if "SenseExample" in sense:
             examples = sense["SenseExample"]
             if isinstance(examples, dict):
@@ -650,7 +896,8 @@ def add_senses(cursor, senses, lexical_entry_id):
                     cursor,
                     sense_id=sense_id,
                     example=text,
-                    type_of_example=example.get("type", "")
+                    type_of_example=example.get("type", ""),
+                    id=ids.take("sense_examples")
                 )
         if "SenseRelation" in sense:
             relations = sense["SenseRelation"]
@@ -663,7 +910,8 @@ def add_senses(cursor, senses, lexical_entry_id):
                     lexical_entry_id=relation.get("id", 0),
                     type_of_relation=relation.get("type", ""),
                     lemma=relation.get("lemma", ""),
-                    homonym_number=relation.get("homonymNumber", 0)
+                    homonym_number=relation.get("homonymNumber", 0),
+                    id=ids.take("sense_relations")
                 )
         if "syntacticPattern" in sense:
             patterns = sense["syntacticPattern"]
@@ -673,7 +921,8 @@ def add_senses(cursor, senses, lexical_entry_id):
                 insert_syntactic_pattern(
                     cursor,
                     sense_id=sense_id,
-                    pattern=pattern
+                    pattern=pattern,
+                    id=ids.take("syntactic_patterns")
                 )
         if "Equivalent" in sense:
             equivalents = sense["Equivalent"]
@@ -686,7 +935,8 @@ def add_senses(cursor, senses, lexical_entry_id):
                     language=equivalent.get("language", ""),
                     lemma=equivalent.get("lemma", ""),
                     definition=equivalent.get("definition", ""),
-                    lexical_id=lexical_entry_id
+                    lexical_id=lexical_entry_id,
+                    id=ids.take("equivalents")
                 )
         
         if "Multimedia" in sense:
@@ -699,48 +949,846 @@ def add_senses(cursor, senses, lexical_entry_id):
                     sense_id=sense_id,
                     type=item.get("type"),
                     label=item.get("label"),
-                    url=item.get("url")
+                    url=item.get("url"),
+                    id=ids.take("multimedia")
                 )
 
 
-def add_to_db(data):
-    entries = data.get("LexicalResource", {}).get("Lexicon", {}).get("LexicalEntry", [])
-    for entry in entries:
-        cursor = conn.cursor()
-        id = entry.get("id")
-        lemma = entry["Lemma"]
-        written_form=lemma.get("writtenForm", "")
-        insert_lexical_entry(
+def add_entry(cursor, entry, ids):
+    id = entry.get("id")
+    lemma = entry["Lemma"]
+    written_form=lemma.get("writtenForm", "")
+    insert_lexical_entry(
+        cursor,
+        part_of_speech=entry.get("partOfSpeech", ""),
+        written_form=written_form,
+        homonym_number=entry.get("homonym_number", 0),
+        lexical_unit=entry.get("lexicalUnit", ""),
+        vocabulary_level=entry.get("vocabularyLevel", ""),
+        id=id,
+        pk=ids.take("phrase_proverbs") if entry.get("partOfSpeech", "") == "" else None
+    )
+    
+    subject_category=entry.get("subjectCategiory")
+    if subject_category:
+        if isinstance(subject_category, str):
+            categories = subject_category.split(",")
+            for category in categories:
+                insert_subject_category(cursor, category, id, id=ids.take("subject_categories"))
+
+    variants = [written_form] + [_ for _ in lemma.get("variant", "").split(",") if _ != '']
+    for variant in variants:
+        insert_variant(cursor, id, variant, id=ids.take("variants"))
+
+    if "semanticCategory" in entry:
+        add_semantic_categories(cursor, entry.get("semanticCategory"), id, ids)
+    add_word_forms(cursor, entry.get("WordForm", []), id, ids)
+    add_senses(cursor, entry.get("Sense", []), id, ids)
+
+
+def add_normalized_senses(cursor, senses, lexical_entry_id, ids):
+    """add_senses for normalized files, where every repeated field already is a list."""
+    for sense in senses:
+        sense_id = ids.take("senses")
+        insert_sense(
             cursor,
-            part_of_speech=entry.get("partOfSpeech", ""),
-            written_form=written_form,
-            homonym_number=entry.get("homonym_number", 0),
-            lexical_unit=entry.get("lexicalUnit", ""),
-            vocabulary_level=entry.get("vocabularyLevel", ""),
-            id=id
+            lexical_entry_id=lexical_entry_id,
+            definition=sense.get("definition", ""),
+            annotation=sense.get("annotation", None),
+            syntactic_annotation=sense.get("syntacticAnnotation", None),
+            id=sense_id
         )
-        
-        subject_category=entry.get("subjectCategiory")
-        if subject_category:
-            if isinstance(subject_category, str):
-                categories = subject_category.split(",")
-                for category in categories:
-                    insert_subject_category(cursor, category, id)
-
-        variants = [written_form] + [_ for _ in lemma.get("variant", "").split(",") if _ != '']
-        for variant in variants:
-            insert_variant(cursor, id, variant)
-
-        if "semanticCategory" in entry:
-            add_semantic_categories(cursor, entry.get("semanticCategory"), id)
-        add_word_forms(cursor, entry.get("WordForm", []), id)
-        add_senses(cursor, entry.get("Sense", []), id)
+        for example in sense.get("SenseExample", ()):
+            text = example.get("example", "")
+            # example dialogues that are just "."
+            if text == '.':
+                continue
+            insert_sense_example(
+                cursor,
+                sense_id=sense_id,
+                example=text,
+                type_of_example=example.get("type", ""),
+                id=ids.take("sense_examples")
+            )
+        for relation in sense.get("SenseRelation", ()):
+            insert_sense_relation(
+                cursor,
+                sense_id=sense_id,
+                lexical_entry_id=relation.get("id", 0),
+                type_of_relation=relation.get("type", ""),
+                lemma=relation.get("lemma", ""),
+                homonym_number=relation.get("homonymNumber", 0),
+                id=ids.take("sense_relations")
+            )
+        for pattern in sense.get("syntacticPattern", ()):
+            insert_syntactic_pattern(cursor, sense_id=sense_id, pattern=pattern, id=ids.take("syntactic_patterns"))
+        for equivalent in sense.get("Equivalent", ()):
+            insert_equivalent(
+                cursor,
+                sense_id=sense_id,
+                language=equivalent.get("language", ""),
+                lemma=equivalent.get("lemma", ""),
+                definition=equivalent.get("definition", ""),
+                lexical_id=lexical_entry_id,
+                id=ids.take("equivalents")
+            )
+        for item in sense.get("Multimedia", ()):
+            insert_multimedia(
+                cursor,
+                sense_id=sense_id,
+                type=item.get("type"),
+                label=item.get("label"),
+                url=item.get("url"),
+                id=ids.take("multimedia")
+            )
 
-    conn.commit()
+
+def add_normalized_word_forms(cursor, word_forms, id, ids):
+    """add_word_forms for normalized files, where pronunciations are always a list."""
+    for form in word_forms:
+        pronunciations = form.get("pronunciation", NO_PRONUNCIATION)
+        sound = form.get("sound", None)
+        word_form_id = ids.take("word_forms", len(pronunciations))
+        for i, pronunciation in enumerate(pronunciations):
+            insert_word_form(
+                cursor,
+                lexical_entry_id=id,
+                type_of_form=form.get("type", ""),
+                written_form=form.get("writtenForm", None),
+                pronunciation=pronunciation,
+                # a single sound belongs to every pronunciation, it is not normalized
+                sound=sound[i] if isinstance(sound, list) else sound,
+                id=word_form_id + i
+            )
+        if "FormRepresentation" in form:
+            representation = form["FormRepresentation"]
+            pronunciation = representation.get("pronunciation", None)
+            insert_form_representation(
+                cursor,
+                word_form_id=word_form_id,
+                type_of_form=representation.get("type", ""),
+                written_form=representation.get("writtenForm", ""),
+                pronunciation=pronunciation,
+                sound=representation.get("sound", None),
+                id=ids.take("form_representations", len(pronunciation) if isinstance(pronunciation, list) else 1)
+            )
+
+
+def add_normalized_entry(cursor, entry, ids):
+    """add_entry for files written by simplify.py --normalize, without the checks for single values."""
+    id = entry.get("id")
+    lemma = entry["Lemma"]
+    written_form = lemma.get("writtenForm", "")
+    insert_lexical_entry(
+        cursor,
+        part_of_speech=entry.get("partOfSpeech", ""),
+        written_form=written_form,
+        homonym_number=entry.get("homonym_number", 0),
+        lexical_unit=entry.get("lexicalUnit", ""),
+        vocabulary_level=entry.get("vocabularyLevel", ""),
+        id=id,
+        pk=ids.take("phrase_proverbs") if entry.get("partOfSpeech", "") == "" else None
+    )
+
+    subject_category = entry.get("subjectCategiory")
+    if subject_category and isinstance(subject_category, str):
+        for category in subject_category.split(","):
+            insert_subject_category(cursor, category, id, id=ids.take("subject_categories"))
+
+    variants = [written_form] + [_ for _ in lemma.get("variant", "").split(",") if _ != '']
+    for variant in variants:
+        insert_variant(cursor, id, variant, id=ids.take("variants"))
+
+    for category in entry.get("semanticCategory", ()):
+        insert_semantic_category(cursor, id, category, id=ids.take("semantic_categories"))
+    add_normalized_word_forms(cursor, entry.get("WordForm", ()), id, ids)
+    add_normalized_senses(cursor, entry.get("Sense", ()), id, ids)
+
+
+def normalized_insert(directory, json_files) -> bool:
+    """Whether all json_files were written normalized and can take the add_normalized_entry path."""
+    normalized = normalized_files(directory)
+    if not normalized:
+        return False
+    other = [json_file.name for json_file in json_files if json_file.name not in normalized]
+    if other:
+        print(f"{', '.join(other)} in {directory} were not written normalized, using the general insert path")
+        return False
+    return True
+
+
+def file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def entry_hash(entry) -> str:
+    return hashlib.sha256(json.dumps(entry, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def set_entry_hash(cursor, lexical_entry_id, file: str, hash: str):
+    cursor.execute("""
+        INSERT OR REPLACE INTO entry_hashes (lexical_entry_id, file, hash)
+        VALUES (?, ?, ?)
+    """, (lexical_entry_id, file, hash))
+
+
+def set_source_file(cursor, name: str, hash: str):
+    cursor.execute("""
+        INSERT OR REPLACE INTO source_files (name, hash)
+        VALUES (?, ?)
+    """, (name, hash))
+
+
+def delete_entry(cursor, lexical_entry_id: int):
+    """Remove an entry and everything belonging to it."""
+    for table in ("sense_examples", "sense_relations", "syntactic_patterns", "multimedia"):
+        cursor.execute(f"""
+            DELETE FROM {table} WHERE sense_id IN (SELECT id FROM senses WHERE lexical_entry_id = ?)
+        """, (lexical_entry_id,))
+    cursor.execute("""
+        DELETE FROM form_representations WHERE word_form_id IN (SELECT id FROM word_forms WHERE lexical_entry_id = ?)
+    """, (lexical_entry_id,))
+    for table in ("senses", "equivalents", "equivalent_terms", "word_forms", "semantic_categories",
+                  "subject_categories", "variants", "entry_hashes"):
+        cursor.execute(f"DELETE FROM {table} WHERE lexical_entry_id = ?", (lexical_entry_id,))
+    cursor.execute("DELETE FROM lexical_entries WHERE id = ?", (lexical_entry_id,))
+    cursor.execute("DELETE FROM phrase_proverbs WHERE id = ?", (lexical_entry_id,))
+
+
+def simplified_files(directory):
+    """The simplified files in directory, the entry lines file where a file was written in both formats."""
+    files = {path.stem: path for path in Path(directory).glob("*.json") if path.name != SHAPES_FILE}
+    files.update({path.stem: path for path in Path(directory).glob("*.jsonl")})
+    return sorted(files.values(), key=lambda path: path.stem)
 
 
-for json_file in Path('simplified').glob("*.json"):
-    with open(json_file, encoding="utf-8") as f:
+def file_entries(json_file, raw=False, simplified_dir=None, report=NO_REPORT):
+    if json_file.suffix == ".jsonl":
+        return iter_entry_lines(json_file)
+    if raw:
+        # parsed while the entries are consumed, the callers measure that. known values are not kept here.
+        return iter_simplified_entries(json_file, simplified_dir, report, known=None)
+    with report.phase("parse"), open(json_file, encoding="utf-8") as f:
         data = json.load(f)
+    return data.get("LexicalResource", {}).get("Lexicon", {}).get("LexicalEntry", [])
+
+
+def add_file_to_db(conn, json_file, ids, raw=False, simplified_dir=None, batch_size: int = BATCH_SIZE,
+                   report=NO_REPORT, normalized: bool = False):
     print(f"Processing {json_file.name}...")
-    add_to_db(data)
\ No newline at end of file
+    add = add_normalized_entry if normalized else add_entry
+    start = time.perf_counter()
+    cursor = BatchCursor(conn.cursor(), batch_size)
+    count = 0
+    for entry in timed(file_entries(json_file, raw, simplified_dir, report), report, "parse"):
+        with report.phase("insert"):
+            add(cursor, entry, ids)
+            set_entry_hash(cursor, entry.get("id"), json_file.name, entry_hash(entry))
+        count += 1
+    with report.phase("insert"):
+        set_source_file(cursor, json_file.name, file_hash(json_file))
+        cursor.flush()
+    with report.phase("commit"):
+        conn.commit()
+    report.add_file(json_file.name, count, cursor.written, time.perf_counter() - start)
+
+
+def update_file_in_db(conn, json_file, ids, raw=False, simplified_dir=None, batch_size: int = BATCH_SIZE,
+                      report=NO_REPORT, normalized: bool = False):
+    """Bring the entries of one file up to date, returns the ids of the entries added, changed or removed.
+
+    Everything happens in one transaction, so an interrupted update is simply redone on the next run.
+    """
+    hash = file_hash(json_file)
+    row = conn.execute("SELECT hash FROM source_files WHERE name = ?", (json_file.name,)).fetchone()
+    if row is not None and row[0] == hash:
+        print(f"Skipping unchanged {json_file.name}...")
+        return []
+    print(f"Updating {json_file.name}...")
+    start = time.perf_counter()
+    add = add_normalized_entry if normalized else add_entry
+
+    known = dict(conn.execute("SELECT lexical_entry_id, hash FROM entry_hashes WHERE file = ?", (json_file.name,)))
+    seen = set()
+    changed = []
+    cursor = BatchCursor(conn.cursor(), batch_size)
+    for entry in timed(file_entries(json_file, raw, simplified_dir, report), report, "parse"):
+        id = int(entry.get("id"))
+        seen.add(id)
+        with report.phase("insert"):
+            new_hash = entry_hash(entry)
+            if id in known:
+                old_hash = known[id]
+            else:
+                # entries can move between files
+                row = conn.execute("SELECT hash FROM entry_hashes WHERE lexical_entry_id = ?", (id,)).fetchone()
+                old_hash = row[0] if row is not None else None
+            if new_hash != old_hash:
+                delete_entry(conn, id)
+                add(cursor, entry, ids)
+                changed.append(id)
+            set_entry_hash(cursor, id, json_file.name, new_hash)
+
+    with report.phase("insert"):
+        for id in known.keys() - seen:
+            delete_entry(conn, id)
+            changed.append(id)
+        set_source_file(cursor, json_file.name, hash)
+        cursor.flush()
+        # in the same transaction, so a run that stops before the rebuilds leaves them to the next one
+        mark_pending(conn, changed)
+    with report.phase("commit"):
+        conn.commit()
+    print(f"{len(changed)} entries added, changed or removed")
+    report.add_file(json_file.name, len(seen), cursor.written, time.perf_counter() - start)
+    return changed
+
+
+def remove_missing_files(conn, names):
+    """Remove the entries of source files that are not in names anymore, returns their ids."""
+    removed = []
+    for (name,) in conn.execute("SELECT name FROM source_files").fetchall():
+        if name in names:
+            continue
+        print(f"Removing {name}...")
+        for (id,) in conn.execute("SELECT lexical_entry_id FROM entry_hashes WHERE file = ?", (name,)).fetchall():
+            delete_entry(conn, id)
+            removed.append(id)
+        conn.execute("DELETE FROM source_files WHERE name = ?", (name,))
+        mark_pending(conn, removed)
+        conn.commit()
+    return removed
+
+
+def mark_pending(conn, ids):
+    conn.executemany("INSERT OR IGNORE INTO pending_entries (lexical_entry_id) VALUES (?)", [(id,) for id in ids])
+
+
+def pending_entries(conn):
+    """Ids of the entries changed since the derived tables were last rebuilt."""
+    return [id for (id,) in conn.execute("SELECT lexical_entry_id FROM pending_entries")]
+
+
+def clear_pending(conn):
+    conn.execute("DELETE FROM pending_entries")
+    conn.commit()
+
+
+def clustered_keys(conn, schema: str = "main"):
+    """Primary key columns of every WITHOUT ROWID table in schema."""
+    keys = {}
+    for (table,) in conn.execute(f"""
+        SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND sql LIKE '%WITHOUT ROWID'
+    """).fetchall():
+        columns = conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()
+        keys[table] = tuple(column for _, column, *_, pk in sorted(columns, key=lambda c: c[5]) if pk)
+    return keys
+
+
+def cluster_tables(conn):
+    """Rebuild the tables in CLUSTERED_KEYS as WITHOUT ROWID tables with their parent first in the primary key.
+
+    Rows already in the tables are copied in key order. Tables that already are clustered, or that are
+    --enum-codes views, are left alone.
+    """
+    keys = clustered_keys(conn)
+    views = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'view'")}
+    for table, key in CLUSTERED_KEYS.items():
+        if table in keys or table in views:
+            continue
+        columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        definitions = ", ".join(
+            f"{column} {type}{' NOT NULL' if notnull or column in key else ''}"
+            for _, column, type, notnull, _, _ in columns
+        )
+        names = ", ".join(column for _, column, *_ in columns)
+        conn.execute(f"CREATE TABLE {table}_clustered ({definitions}, PRIMARY KEY ({', '.join(key)})) WITHOUT ROWID")
+        conn.execute(f"INSERT INTO {table}_clustered ({names}) SELECT {names} FROM {table} ORDER BY {', '.join(key)}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_clustered RENAME TO {table}")
+    conn.commit()
+
+
+def create_indexes(conn):
+    views = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'view'")}
+    keys = clustered_keys(conn)
+    for name, target in {**INDEXES, **CLUSTERED_INDEXES}.items():
+        start = time.perf_counter()
+        table, columns = target.split("(", 1)
+        if table in views:
+            table = f"{table}_coded"
+            target = f"{table}({columns}"
+        if name in CLUSTERED_INDEXES and table not in keys:
+            continue
+        # the primary key of a clustered table already is an index on its leading columns
+        indexed = tuple(columns[:-1].split(", "))
+        if keys.get(table, ())[:len(indexed)] == indexed:
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        print(f"Created index {name} in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    conn.execute("ANALYZE")
+    conn.commit()
+    print(f"Analyzed in {time.perf_counter() - start:.2f}s")
+
+
+def encode_enums(conn):
+    """Store the labels of the mapped columns as integer codes, behind views that still show the labels.
+
+    Every table in ENUM_COLUMNS moves to <table>_coded and a view with its name and columns takes
+    its place. The views have triggers that turn inserts and deletes into writes on the coded table,
+    so the database can be updated as before. Tables that already are views are left alone.
+    """
+    start = time.perf_counter()
+    for enum, mapping in ENUMS.items():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS enum_{enum} (
+                code INTEGER PRIMARY KEY,
+                korean TEXT NOT NULL UNIQUE,
+                english TEXT NOT NULL UNIQUE
+            )
+        """)
+        conn.executemany(f"""
+            INSERT OR IGNORE INTO enum_{enum} (code, korean, english) VALUES (?, ?, ?)
+        """, [(code, korean, english) for code, (korean, english) in enumerate(mapping.items(), 1)])
+
+    views = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'view'")}
+    clustered = clustered_keys(conn)
+    for table, enums in ENUM_COLUMNS.items():
+        if table in views:
+            continue
+        definitions = []
+        columns = []
+        # a clustered table keeps its composite primary key
+        key = clustered.get(table)
+        for _, column, type, notnull, _, pk in conn.execute(f"PRAGMA table_info({table})").fetchall():
+            columns.append(column)
+            if column in enums:
+                definitions.append(f"{column} INTEGER NOT NULL REFERENCES enum_{enums[column]}(code)")
+            else:
+                primary = pk and key is None
+                definitions.append(f"{column} {type}{' PRIMARY KEY' if primary else ''}{' NOT NULL' if notnull else ''}")
+        if key is not None:
+            definitions.append(f"PRIMARY KEY ({', '.join(key)})")
+
+        def encoded(row):
+            return ", ".join(
+                f"(SELECT code FROM enum_{enums[column]} WHERE english = {row}.{column})" if column in enums
+                else f"{row}.{column}"
+                for column in columns
+            )
+
+        conn.execute(f"CREATE TABLE {table}_coded ({', '.join(definitions)}){' WITHOUT ROWID' if key else ''}")
+        conn.execute(f"""
+            INSERT INTO {table}_coded ({', '.join(columns)})
+            SELECT {encoded('t')} FROM {table} t ORDER BY {', '.join(key) if key else 'rowid'}
+        """)
+        conn.execute(f"DROP TABLE {table}")
+
+        # Labels of indexed columns are joined, so filtering on the label can use the index. The others are
+        # looked up per row, which keeps the view a single table SQLite can flatten into outer joins.
+        indexed = {
+            column for target in INDEXES.values() if target.startswith(f"{table}(")
+            for column in target[len(table) + 1:-1].split(", ") if column in enums
+        }
+        labels = ", ".join(
+            f"{column}_label.english AS {column}" if column in indexed
+            else f"(SELECT english FROM enum_{enums[column]} WHERE code = c.{column}) AS {column}" if column in enums
+            else f"c.{column}"
+            for column in columns
+        )
+        joins = " ".join(
+            f"JOIN enum_{enums[column]} {column}_label ON {column}_label.code = c.{column}" for column in indexed
+        )
+        conn.execute(f"CREATE VIEW {table} AS SELECT {labels} FROM {table}_coded c {joins}")
+        conn.execute(f"""
+            CREATE TRIGGER {table}_insert INSTEAD OF INSERT ON {table} BEGIN
+                INSERT INTO {table}_coded ({', '.join(columns)}) VALUES ({encoded('NEW')});
+            END
+        """)
+        if key is not None:
+            match = " AND ".join(f"{column} = OLD.{column}" for column in key)
+        elif table in ID_COLUMNS:
+            match = f"{ID_COLUMNS[table]} = OLD.{ID_COLUMNS[table]}"
+        else:
+            match = " AND ".join(f"{column} IS OLD.{column}" for column in columns if column not in enums)
+        conn.execute(f"""
+            CREATE TRIGGER {table}_delete INSTEAD OF DELETE ON {table} BEGIN
+                DELETE FROM {table}_coded WHERE {match};
+            END
+        """)
+    conn.commit()
+    # give back the pages of the dropped tables
+    conn.execute("VACUUM")
+    print(f"Encoded enum columns in {time.perf_counter() - start:.2f}s")
+
+
+def create_fts(conn):
+    """Full text index over the Korean definitions and the equivalents in every language."""
+    start = time.perf_counter()
+    conn.executescript("""
+    DROP TABLE IF EXISTS meaning_fts;
+    CREATE VIRTUAL TABLE meaning_fts USING fts5(
+        language,
+        lemma,
+        definition,
+        lexical_entry_id UNINDEXED,
+        sense_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+    INSERT INTO meaning_fts (language, lemma, definition, lexical_entry_id, sense_id)
+        SELECT 'Korean', '', definition, lexical_entry_id, id FROM senses;
+    INSERT INTO meaning_fts (language, lemma, definition, lexical_entry_id, sense_id)
+        SELECT language, lemma, definition, lexical_entry_id, sense_id FROM equivalents;
+    INSERT INTO meaning_fts (meaning_fts) VALUES ('optimize');
+    """)
+    conn.commit()
+    print(f"Created meaning_fts in {time.perf_counter() - start:.2f}s")
+
+
+def create_substring_index(conn):
+    """Trigram index for infix search over headwords, variants and example sentences."""
+    start = time.perf_counter()
+    conn.executescript("""
+    DROP TABLE IF EXISTS substring_fts;
+    CREATE VIRTUAL TABLE substring_fts USING fts5(
+        text,
+        source UNINDEXED,
+        row_id UNINDEXED,
+        lexical_entry_id UNINDEXED,
+        tokenize = 'trigram'
+    );
+    INSERT INTO substring_fts (text, source, row_id, lexical_entry_id)
+        SELECT written_form, 'written_form', id, id FROM lexical_entries;
+    -- the first variant of every entry is its written form
+    INSERT INTO substring_fts (text, source, row_id, lexical_entry_id)
+        SELECT v.variant, 'variant', v.id, v.lexical_entry_id
+        FROM variants v LEFT JOIN lexical_entries e ON e.id = v.lexical_entry_id
+        WHERE v.variant IS NOT e.written_form;
+    INSERT INTO substring_fts (text, source, row_id, lexical_entry_id)
+        SELECT x.example, 'example', x.id, s.lexical_entry_id
+        FROM sense_examples x JOIN senses s ON s.id = x.sense_id;
+    INSERT INTO substring_fts (substring_fts) VALUES ('optimize');
+
+    -- the trigram index cannot find fragments of one or two characters, these are looked up here.
+    -- Ordered like the results of search_substring, so a lookup reads only the rows it returns.
+    DROP TABLE IF EXISTS substring_grams;
+    CREATE TABLE substring_grams (
+        gram TEXT NOT NULL,
+        length INTEGER NOT NULL,
+        fts_rowid INTEGER NOT NULL,
+        PRIMARY KEY (gram, length, fts_rowid)
+    ) WITHOUT ROWID;
+    """)
+    # inserted in key order, a WITHOUT ROWID table fills much slower in random order
+    conn.execute("CREATE TEMP TABLE grams (gram TEXT, length INTEGER, fts_rowid INTEGER)")
+    conn.executemany("INSERT INTO temp.grams VALUES (?, ?, ?)", (
+        (gram, len(text), rowid)
+        for rowid, text in conn.execute("SELECT rowid, text FROM substring_fts")
+        if text
+        for gram in {text[i:i + size] for size in (1, 2) for i in range(len(text) - size + 1)}
+    ))
+    conn.execute("""
+        INSERT INTO substring_grams (gram, length, fts_rowid)
+        SELECT gram, length, fts_rowid FROM temp.grams ORDER BY gram, length, fts_rowid
+    """)
+    conn.execute("DROP TABLE temp.grams")
+    conn.commit()
+    print(f"Created substring_fts in {time.perf_counter() - start:.2f}s")
+
+
+def create_relation_graph(conn):
+    """Resolve sense relations to entries and group the entries connected by each type of relation."""
+    start = time.perf_counter()
+    conn.executescript("""
+    DROP TABLE IF EXISTS relation_edges;
+    DROP TABLE IF EXISTS relation_clusters;
+    CREATE TABLE relation_edges (
+        type_of_relation TEXT NOT NULL,
+        source_id INTEGER NOT NULL,
+        target_id INTEGER NOT NULL,
+        PRIMARY KEY (type_of_relation, source_id, target_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE relation_clusters (
+        type_of_relation TEXT NOT NULL,
+        lexical_entry_id INTEGER NOT NULL,
+        cluster_id INTEGER NOT NULL,
+        PRIMARY KEY (type_of_relation, lexical_entry_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX relation_clusters_cluster_id ON relation_clusters(type_of_relation, cluster_id);
+    """)
+    # The target id defaults to 0, then the lemma and homonym number decide, or the lemma alone if it is unique
+    edges = conn.execute("""
+        SELECT r.type_of_relation, s.lexical_entry_id, COALESCE(
+            (SELECT e.id FROM lexical_entries e WHERE e.id = r.lexical_entry_id),
+            (SELECT p.id FROM phrase_proverbs p WHERE p.id = r.lexical_entry_id),
+            (SELECT MIN(e.id) FROM lexical_entries e
+                WHERE e.written_form = r.lemma AND e.homonym_number = r.homonym_number),
+            (SELECT MIN(e.id) FROM lexical_entries e WHERE e.written_form = r.lemma HAVING COUNT(*) = 1)
+        ) AS target_id
+        FROM sense_relations r
+        JOIN senses s ON s.id = r.sense_id
+    """).fetchall()
+    resolved = [(type, source, target) for type, source, target in edges if target is not None and source != target]
+
+    # relations are used in both directions
+    conn.executemany("""
+        INSERT OR IGNORE INTO relation_edges (type_of_relation, source_id, target_id) VALUES (?, ?, ?)
+    """, resolved + [(type, target, source) for type, source, target in resolved])
+
+    parents = {}
+
+    def find(node):
+        root = node
+        while parents[root] != root:
+            root = parents[root]
+        while parents[node] != root:
+            parents[node], node = root, parents[node]
+        return root
+
+    for type, source, target in resolved:
+        source, target = (type, source), (type, target)
+        parents.setdefault(source, source)
+        parents.setdefault(target, target)
+        a, b = find(source), find(target)
+        if a != b:
+            # the smallest entry id names the cluster
+            parents[max(a, b)] = min(a, b)
+    conn.executemany("""
+        INSERT INTO relation_clusters (type_of_relation, lexical_entry_id, cluster_id) VALUES (?, ?, ?)
+    """, [(type, id, find((type, id))[1]) for type, id in parents])
+    conn.commit()
+    print(f"Resolved {len(resolved)} of {len(edges)} sense relations in {time.perf_counter() - start:.2f}s")
+
+
+def write_entry_documents(conn, ids, chunk_size: int = BATCH_SIZE):
+    """Store the assembled entries in entry_documents, ids that do not exist anymore are removed."""
+    ids = list(ids)
+    for i in range(0, len(ids), chunk_size):
+        chunk = ids[i:i + chunk_size]
+        entries = fetch_entries(conn, chunk)
+        conn.executemany("DELETE FROM entry_documents WHERE id = ?", [(id,) for id in chunk if id not in entries])
+        conn.executemany("""
+            INSERT OR REPLACE INTO entry_documents (id, document) VALUES (?, ?)
+        """, [(id, json.dumps(entry, ensure_ascii=False, separators=(",", ":"))) for id, entry in entries.items()])
+    conn.commit()
+
+
+def create_entry_documents(conn):
+    """One json document per entry, so reading an entry is a single primary key lookup."""
+    start = time.perf_counter()
+    conn.executescript("""
+    DROP TABLE IF EXISTS entry_documents;
+    CREATE TABLE entry_documents (
+        id INTEGER PRIMARY KEY,
+        document TEXT NOT NULL
+    );
+    """)
+    ids = [id for (id,) in conn.execute("SELECT id FROM lexical_entries UNION SELECT id FROM phrase_proverbs")]
+    write_entry_documents(conn, ids)
+    print(f"Stored {len(ids)} entry documents in {time.perf_counter() - start:.2f}s")
+
+
+def fsync_path(path):
+    """Flush a file or directory to disk, bulk loads write without any fsync."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def set_pragmas(conn, pragmas):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def sample_helpers(report, every: int):
+    """Time one in every calls of each insert_* helper into report."""
+    module = globals()
+    for name in [name for name in module if name.startswith("insert_")]:
+        # a worker process may have inherited helpers that were wrapped for another report
+        helper = getattr(module[name], "__wrapped__", module[name])
+        module[name] = report.sampled(name, helper, every)
+
+
+def build_shard(json_file, shard_path, raw=False, simplified_dir=None, batch_size: int = BATCH_SIZE,
+                clustered: bool = False, sample_every: int = 0, normalized: bool = False):
+    """Build a database for a single file, numbering its rows from 1. Returns it with the report of the build."""
+    report = BuildReport()
+    if sample_every:
+        sample_helpers(report, sample_every)
+    conn = sqlite3.connect(shard_path)
+    # shards are thrown away after the merge, so they are always bulk loaded
+    set_pragmas(conn, BULK_LOAD_PRAGMAS)
+    init_db(conn, clustered=clustered)
+    add_file_to_db(conn, json_file, IdAllocator(), raw, simplified_dir, batch_size, report, normalized)
+    conn.close()
+    return shard_path, report
+
+
+def merge_shard(conn, shard_path):
+    """Append a shard to conn, shifting its ids past the rows already there."""
+    offsets = {table: next_id - 1 for table, next_id in IdAllocator.from_db(conn).next_ids.items()}
+    conn.execute("ATTACH DATABASE ? AS shard", (str(shard_path),))
+    keys = clustered_keys(conn, "shard")
+    for table in TABLES:
+        columns = [row[1] for row in conn.execute(f"PRAGMA shard.table_info({table})")]
+        shifted = dict(ID_REFERENCES.get(table, {}))
+        if table in ID_COLUMNS:
+            shifted[ID_COLUMNS[table]] = table
+        select = ", ".join(f"{column} + {offsets[shifted[column]]}" if column in shifted else column for column in columns)
+        order = ", ".join(keys[table]) if table in keys else "rowid"
+        conn.execute(f"INSERT INTO main.{table} ({', '.join(columns)}) SELECT {select} FROM shard.{table} ORDER BY {order}")
+    conn.commit()
+    conn.execute("DETACH DATABASE shard")
+
+
+def build_parallel(conn, json_files, jobs: int, raw=False, simplified_dir=None, batch_size: int = BATCH_SIZE,
+                   clustered: bool = False, report=NO_REPORT, sample_every: int = 0, normalized: bool = False):
+    # Shards are merged in file order, which gives every row the id a serial build would give it
+    with tempfile.TemporaryDirectory(prefix="lexicon-shards-", dir=".") as shard_dir:
+        shard_paths = [Path(shard_dir) / f"{i}.db" for i in range(len(json_files))]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(
+                    build_shard, json_file, shard_path, raw, simplified_dir, batch_size, clustered, sample_every,
+                    normalized
+                )
+                for json_file, shard_path in zip(json_files, shard_paths)
+            ]
+            for future in futures:
+                shard_path, shard_report = future.result()
+                # the phases of the workers overlap, their sum is the work done rather than the time it took
+                if isinstance(report, BuildReport):
+                    report.merge(shard_report)
+                print(f"Merging {shard_path.name}...")
+                with report.phase("merge"):
+                    merge_shard(conn, shard_path)
+                shard_path.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build lexicon.db from the krdict json export.")
+    parser.add_argument("--raw", action="store_true",
+                        help="read the raw export from data/ and simplify it on the fly instead of reading simplified/")
+    parser.add_argument("--write-simplified", action="store_true",
+                        help="with --raw, also write the simplified json to simplified/")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="rows buffered per table before they are written with executemany")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="number of worker processes, each building a shard database from one file")
+    parser.add_argument("--bulk", action="store_true",
+                        help="build into a temporary file without journal and fsyncs, then move it over lexicon.db")
+    parser.add_argument("--clustered", action="store_true",
+                        help="store child rows as WITHOUT ROWID tables keyed by their parent, so an entry's rows are adjacent")
+    parser.add_argument("--enum-codes", action="store_true",
+                        help="store part of speech, language, category and type labels as integer codes behind views")
+    parser.add_argument("--no-indexes", action="store_true",
+                        help="skip creating the secondary indexes after the load")
+    parser.add_argument("--fts", action="store_true",
+                        help="create the meaning_fts full text index over definitions and equivalents")
+    parser.add_argument("--substring-index", action="store_true",
+                        help="create the substring_fts trigram index over headwords, variants and examples")
+    parser.add_argument("--relation-graph", action="store_true",
+                        help="resolve sense relations into relation_edges and relation_clusters")
+    parser.add_argument("--documents", action="store_true",
+                        help="store every assembled entry as json in entry_documents")
+    parser.add_argument("--incremental", action="store_true",
+                        help="update lexicon.db in place, only reinserting entries that changed since the last build")
+    parser.add_argument("--sample-inserts", type=int, default=0, metavar="N",
+                        help="time one in N calls of each insert_* helper and add the estimates to the build report")
+    args = parser.parse_args()
+    if args.incremental and (args.bulk or args.jobs > 1):
+        parser.error("--incremental cannot be combined with --bulk or --jobs")
+
+    report = BuildReport()
+    if args.sample_inserts:
+        sample_helpers(report, args.sample_inserts)
+    db_path = Path("lexicon.db")
+    build_path = db_path.with_name(db_path.name + ".tmp") if args.bulk else db_path
+    if args.bulk:
+        build_path.unlink(missing_ok=True)
+    conn = sqlite3.connect(build_path)
+    if args.bulk:
+        set_pragmas(conn, BULK_LOAD_PRAGMAS)
+    with report.phase("init"):
+        init_db(conn, drop=not args.incremental, clustered=args.clustered)
+
+    simplified_dir = None
+    if args.raw and args.write_simplified:
+        simplified_dir = Path("simplified")
+        simplified_dir.mkdir(exist_ok=True)
+        # the files written here are not normalized
+        (simplified_dir / SHAPES_FILE).unlink(missing_ok=True)
+    json_files = sorted(Path('data').glob("*.json")) if args.raw else simplified_files("simplified")
+    normalized = not args.raw and normalized_insert("simplified", json_files)
+
+    if args.incremental:
+        ids = IdAllocator.from_db(conn)
+        for json_file in json_files:
+            update_file_in_db(conn, json_file, ids, args.raw, simplified_dir, args.batch_size, report, normalized)
+        with report.phase("insert"):
+            remove_missing_files(conn, {json_file.name for json_file in json_files})
+        # includes the entries changed by an earlier run that stopped before this point
+        changed = pending_entries(conn)
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "entry_documents" in tables and not args.documents:
+            with report.phase("documents"):
+                write_entry_documents(conn, changed)
+        # the search tables are derived from the whole database, rebuild those that exist
+        if changed:
+            args.fts = args.fts or "meaning_fts" in tables
+            args.substring_index = args.substring_index or "substring_fts" in tables
+            args.relation_graph = args.relation_graph or "relation_edges" in tables
+    elif args.jobs > 1:
+        build_parallel(conn, json_files, args.jobs, args.raw, simplified_dir, args.batch_size, args.clustered,
+                       report, args.sample_inserts, normalized)
+    else:
+        ids = IdAllocator()
+        for json_file in json_files:
+            add_file_to_db(conn, json_file, ids, args.raw, simplified_dir, args.batch_size, report, normalized)
+
+    if args.enum_codes:
+        with report.phase("enum_codes"):
+            encode_enums(conn)
+    if not args.no_indexes:
+        with report.phase("index"):
+            create_indexes(conn)
+    if args.fts:
+        with report.phase("fts"):
+            create_fts(conn)
+    if args.substring_index:
+        with report.phase("substring_index"):
+            create_substring_index(conn)
+    if args.relation_graph:
+        with report.phase("relation_graph"):
+            create_relation_graph(conn)
+    if args.documents:
+        with report.phase("documents"):
+            create_entry_documents(conn)
+    if args.incremental:
+        # only once everything derived from the changed entries has been committed
+        clear_pending(conn)
+
+    if args.bulk:
+        # the bulk pragmas only last as long as the connection, the file itself is a plain database
+        conn.commit()
+        conn.close()
+        # synchronous is off, so the file has to be on disk before it replaces the old database
+        fsync_path(build_path)
+        os.replace(build_path, db_path)
+        if os.name == "posix":
+            # and the rename has to be on disk before the build counts as done
+            fsync_path(db_path.parent)
+    else:
+        conn.close()
+    report.write(db_path.with_suffix(".report.json"), options=vars(args), normalized=normalized, db_size_bytes=db_path.stat().st_size)
+
+
+if __name__ == "__main__":
+    main()
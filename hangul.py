@@ -0,0 +1,49 @@
+"""Decomposition of Hangul syllables into the jamo typed on a keyboard."""
+
+SYLLABLE_BASE = 0xAC00
+SYLLABLE_COUNT = 11172
+
+CHOSEONG = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+JUNGSEONG = "ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ"
+JONGSEONG = ["", *"ㄱㄲㄳㄴㄵㄶㄷㄹㄺㄻㄼㄽㄾㄿㅀㅁㅂㅄㅅㅆㅇㅈㅊㅋㅌㅍㅎ"]
+
+# Jamo that take two keystrokes
+COMPOUND_JAMO = {
+    "ㄳ": "ㄱㅅ", "ㄵ": "ㄴㅈ", "ㄶ": "ㄴㅎ", "ㄺ": "ㄹㄱ", "ㄻ": "ㄹㅁ", "ㄼ": "ㄹㅂ", "ㄽ": "ㄹㅅ",
+    "ㄾ": "ㄹㅌ", "ㄿ": "ㄹㅍ", "ㅀ": "ㄹㅎ", "ㅄ": "ㅂㅅ",
+    "ㅘ": "ㅗㅏ", "ㅙ": "ㅗㅐ", "ㅚ": "ㅗㅣ", "ㅝ": "ㅜㅓ", "ㅞ": "ㅜㅔ", "ㅟ": "ㅜㅣ", "ㅢ": "ㅡㅣ",
+}
+
+
+def decompose(text: str) -> str:
+    """Spell text as jamo keystrokes, so incomplete syllables are prefixes of complete ones (사라 -> ㅅㅏㄹㅏ)."""
+    result = []
+    for c in text:
+        index = ord(c) - SYLLABLE_BASE
+        if 0 <= index < SYLLABLE_COUNT:
+            result.append(CHOSEONG[index // 588])
+            vowel = JUNGSEONG[(index % 588) // 28]
+            result.append(COMPOUND_JAMO.get(vowel, vowel))
+            final = JONGSEONG[index % 28]
+            result.append(COMPOUND_JAMO.get(final, final))
+        else:
+            result.append(COMPOUND_JAMO.get(c, c))
+    return "".join(result)
+
+
+def choseong(text: str) -> str:
+    """The initial consonant of every syllable (사랑 -> ㅅㄹ), other characters are kept and whitespace dropped."""
+    result = []
+    for c in text:
+        index = ord(c) - SYLLABLE_BASE
+        if 0 <= index < SYLLABLE_COUNT:
+            result.append(CHOSEONG[index // 588])
+        elif not c.isspace():
+            result.append(c)
+    return "".join(result)
+
+
+def is_choseong(text: str) -> bool:
+    """Whether text only consists of initial consonants, like ㅅㄹ."""
+    text = "".join(text.split())
+    return bool(text) and all(c in CHOSEONG for c in text)
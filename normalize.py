@@ -0,0 +1,33 @@
+"""Normalization of the foreign language lemmas of equivalents for the reverse lookup."""
+import re
+import unicodedata
+
+TERM_SEPARATORS = re.compile(r"[;,]")
+
+# Accents are only stripped from Latin, Greek and Cyrillic letters, in other scripts
+# (Japanese dakuten, Thai vowels, ...) the combining marks are part of the letter
+ACCENTED_SCRIPTS_END = 0x0530
+
+
+def normalize_term(text: str) -> str:
+    """Case fold, strip accents and collapse whitespace: "  Café " -> "cafe"."""
+    result = []
+    base = 0
+    for c in unicodedata.normalize("NFD", text.casefold()):
+        if unicodedata.combining(c):
+            if base < ACCENTED_SCRIPTS_END:
+                continue
+        else:
+            base = ord(c)
+        result.append(c)
+    return " ".join(unicodedata.normalize("NFC", "".join(result)).split())
+
+
+def split_terms(lemma: str) -> list:
+    """The distinct normalized terms of a lemma like "love; affection, fondness"."""
+    terms = []
+    for part in TERM_SEPARATORS.split(lemma):
+        term = normalize_term(part)
+        if term and term not in terms:
+            terms.append(term)
+    return terms
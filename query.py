@@ -0,0 +1,395 @@
+from collections import OrderedDict
+from itertools import count
+import json
+from typing import Optional
+
+import hangul
+from normalize import normalize_term
+
+# Restricts a query to the ids passed as a json array
+SELECTED_IDS = "SELECT value FROM json_each(?)"
+
+lookup_table_numbers = count()
+
+
+def fetch_dicts(cursor):
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def fts_query(text: str) -> str:
+    """Quote every word of text so FTS5 matches it literally."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def search_meaning(conn, text: str, language: Optional[str] = None, limit: int = 20):
+    """Lexical entries whose definition or equivalents match all words of text, best match first.
+
+    language is one of the values of language_map in db.py ("English", "Vietnamese", ...),
+    "Korean" searches the Korean definitions. Needs the meaning_fts table from db.py --fts.
+    """
+    match = f"{{lemma definition}} : ({fts_query(text)})"
+    if language is not None:
+        match = f"language : {fts_query(language)} AND {match}"
+    cursor = conn.execute("""
+        WITH hits AS MATERIALIZED (
+            SELECT lexical_entry_id, bm25(meaning_fts, 0.0, 10.0, 1.0) AS score
+            FROM meaning_fts
+            WHERE meaning_fts MATCH ?
+        )
+        SELECT e.id, e.written_form, e.homonym_number, e.part_of_speech, e.vocabulary_level,
+               MIN(hits.score) AS score
+        FROM hits
+        JOIN lexical_entries e ON e.id = hits.lexical_entry_id
+        GROUP BY e.id
+        ORDER BY score
+        LIMIT ?
+    """, (match, limit))
+    return fetch_dicts(cursor)
+
+
+def search_substring(conn, fragment: str, source: Optional[str] = None, limit: int = 50):
+    """Headwords, variants and example sentences containing fragment, shortest text first.
+
+    source restricts the search to "written_form", "variant" or "example". Fragments of three
+    or more characters are looked up in the trigram index, shorter ones in substring_grams.
+    Needs the substring_fts table from db.py --substring-index.
+    """
+    if len(fragment) >= 3:
+        sql = """
+            SELECT text, source, row_id, lexical_entry_id
+            FROM substring_fts
+            WHERE substring_fts MATCH ?
+        """
+        parameters = ['"' + fragment.replace('"', '""') + '"']
+        if source is not None:
+            sql += " AND source = ?"
+            parameters.append(source)
+        sql += " ORDER BY length(text), rowid LIMIT ?"
+    else:
+        sql = """
+            SELECT f.text, f.source, f.row_id, f.lexical_entry_id
+            FROM substring_grams g
+            JOIN substring_fts f ON f.rowid = g.fts_rowid
+            WHERE g.gram = ?
+        """
+        parameters = [fragment]
+        if source is not None:
+            sql += " AND f.source = ?"
+            parameters.append(source)
+        sql += " ORDER BY g.length, g.fts_rowid LIMIT ?"
+    parameters.append(limit)
+    return fetch_dicts(conn.execute(sql, parameters))
+
+
+def lookup_prefix(conn, text: str, limit: int = 20):
+    """Headwords and variants starting with text, for autocompletion of incomplete input.
+
+    Input made of initial consonants only (ㅅㄹ) is matched against the initial consonants of
+    every syllable, anything else by jamo, so 사라 finds 사랑.
+    """
+    if hangul.is_choseong(text):
+        column, key = "choseong", hangul.choseong(text)
+    else:
+        column, key = "jamo", hangul.decompose(text)
+    cursor = conn.execute(f"""
+        SELECT v.lexical_entry_id, v.variant, e.written_form, e.homonym_number,
+               e.part_of_speech, e.vocabulary_level
+        FROM variants v
+        LEFT JOIN lexical_entries e ON e.id = v.lexical_entry_id
+        WHERE v.{column} >= ? AND v.{column} < ?
+        ORDER BY length(v.variant), v.id
+        LIMIT ?
+    """, (key, key + chr(0x10FFFF), limit))
+    return fetch_dicts(cursor)
+
+
+def fetch_entries(conn, ids) -> dict:
+    """Assemble complete entries in a fixed number of queries, however many ids are asked for.
+
+    Entries have the shape add_entry in db.py reads from the simplified json, with values as
+    stored in the database (English labels) and repeated elements always in lists. Ids that
+    do not exist are left out.
+    """
+    selected = json.dumps([int(id) for id in ids])
+    entries = {}
+    for id, part_of_speech, written_form, homonym_number, lexical_unit, vocabulary_level in conn.execute(f"""
+        SELECT id, part_of_speech, written_form, homonym_number, lexical_unit, vocabulary_level
+        FROM lexical_entries WHERE id IN ({SELECTED_IDS})
+    """, (selected,)):
+        entries[id] = {
+            "id": id,
+            "Lemma": {"writtenForm": written_form},
+            "partOfSpeech": part_of_speech,
+            "homonym_number": homonym_number,
+            "lexicalUnit": lexical_unit,
+            "vocabularyLevel": vocabulary_level,
+        }
+    for id, written_form, lexical_unit in conn.execute(f"""
+        SELECT id, written_form, lexical_unit FROM phrase_proverbs WHERE id IN ({SELECTED_IDS})
+    """, (selected,)):
+        entries[id] = {"id": id, "Lemma": {"writtenForm": written_form}, "lexicalUnit": lexical_unit}
+    if not entries:
+        return entries
+
+    variants = {}
+    for lexical_entry_id, variant in conn.execute(f"""
+        SELECT lexical_entry_id, variant FROM variants WHERE lexical_entry_id IN ({SELECTED_IDS}) ORDER BY id
+    """, (selected,)):
+        variants.setdefault(lexical_entry_id, []).append(variant)
+    for lexical_entry_id, (_, *rest) in variants.items():
+        # the first variant is the written form
+        if rest:
+            entries[lexical_entry_id]["Lemma"]["variant"] = ",".join(rest)
+
+    for lexical_entry_id, base, detail in conn.execute(f"""
+        SELECT lexical_entry_id, base, detail FROM semantic_categories
+        WHERE lexical_entry_id IN ({SELECTED_IDS}) ORDER BY id
+    """, (selected,)):
+        entries[lexical_entry_id].setdefault("semanticCategory", []).append(f"{base} > {detail}")
+
+    subject_categories = {}
+    for lexical_entry_id, name in conn.execute(f"""
+        SELECT lexical_entry_id, name FROM subject_categories WHERE lexical_entry_id IN ({SELECTED_IDS}) ORDER BY id
+    """, (selected,)):
+        subject_categories.setdefault(lexical_entry_id, []).append(name)
+    for lexical_entry_id, names in subject_categories.items():
+        entries[lexical_entry_id]["subjectCategiory"] = ",".join(names)
+
+    word_forms = {}
+    for id, lexical_entry_id, pronunciation, sound, type_of_form, written_form in conn.execute(f"""
+        SELECT id, lexical_entry_id, pronunciation, sound, type_of_form, written_form FROM word_forms
+        WHERE lexical_entry_id IN ({SELECTED_IDS}) ORDER BY id
+    """, (selected,)):
+        form = form_dict(type_of_form, written_form, pronunciation, sound)
+        word_forms[id] = form
+        entries[lexical_entry_id].setdefault("WordForm", []).append(form)
+    for word_form_id, pronunciation, sound, type_of_form, written_form in conn.execute(f"""
+        SELECT word_form_id, pronunciation, sound, type_of_form, written_form FROM form_representations
+        WHERE word_form_id IN (SELECT id FROM word_forms WHERE lexical_entry_id IN ({SELECTED_IDS}))
+        ORDER BY id
+    """, (selected,)):
+        form = word_forms[word_form_id]
+        if "FormRepresentation" in form:
+            # a representation with several pronunciations is stored as one row per pronunciation
+            representation = form["FormRepresentation"]
+            for key, value in (("pronunciation", pronunciation), ("sound", sound)):
+                if key in representation and not isinstance(representation[key], list):
+                    representation[key] = [representation[key]]
+                if value is not None:
+                    representation.setdefault(key, []).append(value)
+        else:
+            form["FormRepresentation"] = form_dict(type_of_form, written_form, pronunciation, sound)
+
+    senses = {}
+    for id, lexical_entry_id, definition, annotation, syntactic_annotation in conn.execute(f"""
+        SELECT id, lexical_entry_id, definition, annotation, syntactic_annotation FROM senses
+        WHERE lexical_entry_id IN ({SELECTED_IDS}) ORDER BY id
+    """, (selected,)):
+        sense = {"definition": definition}
+        if annotation is not None:
+            sense["annotation"] = annotation
+        if syntactic_annotation is not None:
+            sense["syntacticAnnotation"] = syntactic_annotation
+        senses[id] = sense
+        entries[lexical_entry_id].setdefault("Sense", []).append(sense)
+
+    selected_senses = f"SELECT id FROM senses WHERE lexical_entry_id IN ({SELECTED_IDS})"
+    for sense_id, example, type_of_example in conn.execute(f"""
+        SELECT sense_id, example, type_of_example FROM sense_examples
+        WHERE sense_id IN ({selected_senses}) ORDER BY id
+    """, (selected,)):
+        senses[sense_id].setdefault("SenseExample", []).append({"type": type_of_example, "example": example})
+    for sense_id, lexical_entry_id, type_of_relation, lemma, homonym_number in conn.execute(f"""
+        SELECT sense_id, lexical_entry_id, type_of_relation, lemma, homonym_number FROM sense_relations
+        WHERE sense_id IN ({selected_senses}) ORDER BY id
+    """, (selected,)):
+        senses[sense_id].setdefault("SenseRelation", []).append(
+            {"type": type_of_relation, "lemma": lemma, "homonymNumber": homonym_number, "id": lexical_entry_id}
+        )
+    for sense_id, pattern in conn.execute(f"""
+        SELECT sense_id, pattern FROM syntactic_patterns WHERE sense_id IN ({selected_senses}) ORDER BY id
+    """, (selected,)):
+        senses[sense_id].setdefault("syntacticPattern", []).append(pattern)
+    for sense_id, language, lemma, definition in conn.execute(f"""
+        SELECT sense_id, language, lemma, definition FROM equivalents
+        WHERE lexical_entry_id IN ({SELECTED_IDS}) ORDER BY id
+    """, (selected,)):
+        senses[sense_id].setdefault("Equivalent", []).append(
+            {"language": language, "lemma": lemma, "definition": definition}
+        )
+    for sense_id, type_of_media, label, url in conn.execute(f"""
+        SELECT sense_id, type_of_media, label, url FROM multimedia WHERE sense_id IN ({selected_senses}) ORDER BY id
+    """, (selected,)):
+        senses[sense_id].setdefault("Multimedia", []).append({"type": type_of_media, "label": label, "url": url})
+
+    return entries
+
+
+def form_dict(type_of_form, written_form, pronunciation, sound) -> dict:
+    form = {"type": type_of_form}
+    if written_form is not None:
+        form["writtenForm"] = written_form
+    if pronunciation is not None:
+        form["pronunciation"] = pronunciation
+    if sound is not None:
+        form["sound"] = sound
+    return form
+
+
+def fetch_documents(conn, ids) -> dict:
+    """Entries stored by db.py --documents, in the same shape as fetch_entries."""
+    return {
+        id: json.loads(document)
+        for id, document in conn.execute(f"""
+            SELECT id, document FROM entry_documents WHERE id IN ({SELECTED_IDS})
+        """, (json.dumps([int(id) for id in ids]),))
+    }
+
+
+class EntryStore:
+    """Complete entries from lexicon.db, with the most recently used ones kept in memory.
+
+    Entries are read from entry_documents if the database has them, else assembled from the
+    tables. The returned entries are shared with the cache and must not be modified. Call
+    clear() after the database was updated.
+    """
+
+    def __init__(self, conn, cache_size: int = 4096):
+        self.conn = conn
+        self.fetch = fetch_documents if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entry_documents'"
+        ).fetchone() else fetch_entries
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_entry(self, id: int) -> Optional[dict]:
+        return self.get_entries([id]).get(int(id))
+
+    def get_entries(self, ids) -> dict:
+        """Entries by id in the order of ids, missing ids are left out. Uncached ones are fetched together."""
+        ids = [int(id) for id in ids]
+        missing = []
+        for id in ids:
+            if id in self.cache:
+                self.cache.move_to_end(id)
+                self.hits += 1
+            else:
+                missing.append(id)
+                self.misses += 1
+        fetched = self.fetch(self.conn, missing) if missing else {}
+        result = {}
+        for id in ids:
+            entry = self.cache.get(id) or fetched.get(id)
+            if entry is not None:
+                result[id] = entry
+        for id, entry in fetched.items():
+            self.cache[id] = entry
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    def clear(self):
+        self.cache.clear()
+
+
+def resolve_words(conn, words):
+    """Look up a whole word list at once, yielding (word, matches) for every word in input order.
+
+    matches lists every homonym whose written form or variant is the word. The words go into a
+    temporary table in one insert and are resolved with a single join on the variants index.
+    """
+    table = f"lookup_words_{next(lookup_table_numbers)}"
+    # the insert below opens a transaction, which would keep lexicon.db locked for writers
+    opened_transaction = not conn.in_transaction
+    conn.execute(f"CREATE TEMP TABLE {table} (position INTEGER PRIMARY KEY, word TEXT NOT NULL)")
+    cursor = None
+    try:
+        conn.executemany(f"INSERT INTO temp.{table} (word) VALUES (?)", ((word.strip(),) for word in words))
+        # the first variant of every entry is its written form
+        cursor = conn.execute(f"""
+            SELECT w.position, w.word, e.id, e.written_form, e.homonym_number, e.part_of_speech, e.vocabulary_level
+            FROM temp.{table} w
+            LEFT JOIN variants v ON v.variant = w.word
+            LEFT JOIN lexical_entries e ON e.id = v.lexical_entry_id
+            ORDER BY w.position
+        """)
+        position, word, matches = None, None, {}
+        for row_position, row_word, id, written_form, homonym_number, part_of_speech, vocabulary_level in cursor:
+            if row_position != position:
+                if position is not None:
+                    yield word, sorted(matches.values(), key=lambda match: (match["homonym_number"], match["id"]))
+                position, word, matches = row_position, row_word, {}
+            # phrases have no lexical entry, and an entry can list its written form as a variant again
+            if id is not None and id not in matches:
+                matches[id] = {
+                    "id": id,
+                    "written_form": written_form,
+                    "homonym_number": homonym_number,
+                    "part_of_speech": part_of_speech,
+                    "vocabulary_level": vocabulary_level,
+                }
+        if position is not None:
+            yield word, sorted(matches.values(), key=lambda match: (match["homonym_number"], match["id"]))
+    finally:
+        if cursor is not None:
+            cursor.close()
+        conn.execute(f"DROP TABLE temp.{table}")
+        if opened_transaction and conn.in_transaction:
+            conn.commit()
+
+
+def lookup_translation(conn, word: str, language: str, limit: int = 20):
+    """Korean entries with word among the equivalents in language, most basic vocabulary first.
+
+    Case and accents are ignored, language is one of the values of language_map in db.py.
+    """
+    cursor = conn.execute("""
+        SELECT e.id, e.written_form, e.homonym_number, e.part_of_speech, e.vocabulary_level,
+               COUNT(DISTINCT t.sense_id) AS senses
+        FROM equivalent_terms t
+        JOIN lexical_entries e ON e.id = t.lexical_entry_id
+        WHERE t.language = ? AND t.term = ?
+        GROUP BY e.id
+        ORDER BY CASE e.vocabulary_level
+                     WHEN 'Beginner' THEN 0 WHEN 'Intermediate' THEN 1 WHEN 'Advanced' THEN 2 ELSE 3
+                 END,
+                 senses DESC, e.id
+        LIMIT ?
+    """, (language, normalize_term(word), limit))
+    return fetch_dicts(cursor)
+
+
+def related_entries(conn, lexical_entry_id: int, type_of_relation: str = "Synonym", max_hops: int = 1) -> dict:
+    """Entries reachable over relations of one type within max_hops, mapped to their distance.
+
+    type_of_relation is a value of type_map in db.py, e.g. "Synonym", "Antonym" or "Reference Word".
+    Needs the relation_edges table from db.py --relation-graph.
+    """
+    hops = {int(lexical_entry_id): 0}
+    frontier = [int(lexical_entry_id)]
+    for hop in range(1, max_hops + 1):
+        rows = conn.execute(f"""
+            SELECT DISTINCT target_id FROM relation_edges
+            WHERE type_of_relation = ? AND source_id IN ({SELECTED_IDS})
+        """, (type_of_relation, json.dumps(frontier)))
+        frontier = [target for (target,) in rows if target not in hops]
+        if not frontier:
+            break
+        for target in frontier:
+            hops[target] = hop
+    del hops[int(lexical_entry_id)]
+    return hops
+
+
+def relation_cluster(conn, lexical_entry_id: int, type_of_relation: str = "Synonym") -> list:
+    """All entries connected to the entry by relations of one type, however many hops away."""
+    rows = conn.execute("""
+        SELECT c.lexical_entry_id FROM relation_clusters own
+        JOIN relation_clusters c ON c.type_of_relation = own.type_of_relation AND c.cluster_id = own.cluster_id
+        WHERE own.type_of_relation = ? AND own.lexical_entry_id = ? AND c.lexical_entry_id != own.lexical_entry_id
+        ORDER BY c.lexical_entry_id
+    """, (type_of_relation, int(lexical_entry_id)))
+    return [id for (id,) in rows]
@@ -0,0 +1,128 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+import functools
+import json
+import random
+import time
+
+
+class NoReport:
+    """Stands in for a BuildReport when nothing is measured."""
+
+    def phase(self, name: str):
+        return nullcontext()
+
+    def add_file(self, name: str, entries: int, rows, seconds: float):
+        pass
+
+
+NO_REPORT = NoReport()
+
+
+def timed(iterable, report, name: str):
+    """Iterate over iterable, counting the time spent getting the next item as phase name."""
+    iterator = iter(iterable)
+    end = object()
+    while True:
+        with report.phase(name):
+            item = next(iterator, end)
+        if item is end:
+            return
+        yield item
+
+
+class BuildReport:
+    """Collects where the time of a build goes, written as json once the build is done.
+
+    Phases can be nested, a phase only counts the time not spent in the phases inside it, so
+    the phases add up to the measured time.
+    """
+
+    def __init__(self):
+        self.started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.start = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.files = []
+        self.helpers = {}
+        # time spent in nested phases, one item per open phase
+        self.nested = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        self.nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] += elapsed - self.nested.pop()
+            if self.nested:
+                self.nested[-1] += elapsed
+
+    def add_file(self, name: str, entries: int, rows, seconds: float):
+        total = sum(rows.values())
+        self.files.append({
+            "name": name,
+            "entries": entries,
+            "seconds": seconds,
+            "rows": dict(rows),
+            "rows_per_second": total / seconds if total and seconds else None,
+        })
+
+    def sampled(self, name: str, function, every: int):
+        """Wrap function so one in every calls, chosen at random, is timed.
+
+        Calls are picked at random rather than counted off, a fixed step would keep hitting the
+        calls that happen to flush a full batch.
+        """
+        stats = self.helpers.setdefault(name, {"calls": 0, "sampled": 0, "sampled_seconds": 0.0})
+        draw = random.Random(name).random
+        rate = 1 / every
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            stats["calls"] += 1
+            if draw() >= rate:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats["sampled"] += 1
+                stats["sampled_seconds"] += time.perf_counter() - start
+
+        return wrapper
+
+    def merge(self, other: "BuildReport"):
+        """Add the measurements of a report from a worker process."""
+        for name, seconds in other.phases.items():
+            self.phases[name] += seconds
+        self.files += other.files
+        for name, stats in other.helpers.items():
+            own = self.helpers.setdefault(name, {"calls": 0, "sampled": 0, "sampled_seconds": 0.0})
+            for key, value in stats.items():
+                own[key] += value
+
+    def to_dict(self, **extra):
+        rows = Counter()
+        for file in self.files:
+            rows.update(file["rows"])
+        helpers = {
+            name: {**stats, "estimated_seconds": stats["sampled_seconds"] * stats["calls"] / stats["sampled"]
+                   if stats["sampled"] else None}
+            for name, stats in self.helpers.items()
+        }
+        return {
+            "started": self.started,
+            "seconds": time.perf_counter() - self.start,
+            **extra,
+            "phases": dict(self.phases),
+            "rows": dict(rows),
+            "files": self.files,
+            "helpers": helpers,
+        }
+
+    def write(self, path, **extra):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(**extra), f, indent=2)
@@ -1,84 +1,643 @@
+from array import array
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import argparse
 import json
 import logging
+import sys
+import tempfile
+import time
 from pathlib import Path
+from typing import Optional
+
+from report import NO_REPORT, BuildReport, timed
 
 logger = logging.getLogger(__name__)
 any_error = False
 
+# Where the entries live in an export, the only part of a file that grows with its size
+ENTRY_PATH = ("LexicalResource", "Lexicon", "LexicalEntry")
+CHUNK_SIZE = 1 << 16
+
 known_values = defaultdict(set)
 
-def simplify(obj, path="root"):
+# Written next to the simplified files when their shapes are normalized
+SHAPES_FILE = "shapes.json"
+
+# A single value of these means something else than a list holding it: a list of examples is a
+# dialogue, a single sound belongs to every pronunciation and subject categories are split on commas.
+SHAPE_SENSITIVE_KEYS = frozenset(["example", "sound", "subjectCategiory"])
+
+# Fields db.py reads as lists from normalized files, by their path in the entry. They are always
+# normalized, whether the profile saw them as a list or not.
+LIST_FIELDS = frozenset([
+    "semanticCategory", "WordForm", "WordForm.pronunciation", "Sense", "Sense.SenseExample", "Sense.SenseRelation",
+    "Sense.syntacticPattern", "Sense.Equivalent", "Sense.Multimedia",
+])
+
+# Keys whose values are free text rather than one of a few known values
+FREE_TEXT_KEYS = frozenset([
+    "sound", "label", "id", "url", "writtenForm", "variant", "lemma", "definition", "example",
+    "syntacticPattern", "pronunciation", "origin", "annotation",
+])
+
+
+def frame_path(path, stack):
+    """Build the path of a child of the top frame, only needed for error messages."""
+    parts = [path]
+    for _, result, key in stack:
+        parts.append(f"[{key}]" if isinstance(result, list) else f".{key}")
+    return "".join(parts)
+
+
+def open_dict(obj, path, stack):
+    """Start simplifying a dict, resolving its own att/val pair."""
     global any_error
-    if isinstance(obj, list):
-        return [simplify(item, path=f"{path}[{i}]") for i, item in enumerate(obj)]
-
-    elif isinstance(obj, dict):
-        new_obj = {}
-        if "att" in obj and "val" in obj:
-            att_key = obj["att"]
-            val_val = obj["val"]
-            if att_key in obj:
-                logger.error(f"[ERROR] Key collision at {path}: key '{att_key}' already exists.")
-                any_error = True
-                # keep the original in this case
-                new_obj["att"] = att_key
-                new_obj["val"] = val_val
+    new_obj = {}
+    if "att" in obj and "val" in obj:
+        att_key = obj["att"]
+        val_val = obj["val"]
+        if att_key in obj:
+            logger.error(f"[ERROR] Key collision at {frame_path(path, stack)}: key '{att_key}' already exists.")
+            any_error = True
+            # keep the original in this case
+            new_obj["att"] = att_key
+            new_obj["val"] = val_val
+        else:
+            new_obj[att_key] = val_val
+    return new_obj
+
+
+def merge_items(items):
+    """Fold a feat or Lemma list of dicts into one dict, or None if the dicts share a key and the list is dropped."""
+    dicts = [item for item in items if isinstance(item, dict)]
+    if dicts:
+        others = dicts[1:]
+        for key in dicts[0]:
+            if all(key in other for other in others):
+                return None
+    merged_dict = {}
+    for item in dicts:
+        for sub_k, sub_v in item.items():
+            if sub_k in merged_dict:
+                if isinstance(merged_dict[sub_k], list):
+                    merged_dict[sub_k].append(sub_v)
+                else:
+                    merged_dict[sub_k] = [merged_dict[sub_k], sub_v]
+            else:
+                merged_dict[sub_k] = sub_v
+    return merged_dict
+
+
+def merge_pairs(items, known):
+    """merge_items for a list that only holds lone att/val pairs, done without simplifying each pair first.
+
+    Returns NOT_PAIRS if the list holds anything else.
+    """
+    for item in items:
+        if not (isinstance(item, dict) and len(item) == 2 and "val" in item):
+            return NOT_PAIRS
+        att_key = item.get("att")
+        if att_key is None or att_key in item or att_key == "feat":
+            return NOT_PAIRS
+    if known is not None:
+        for item in items:
+            val_val = item["val"]
+            if isinstance(val_val, str) and item["att"] not in FREE_TEXT_KEYS:
+                known[item["att"]].add(val_val)
+    if items:
+        first = items[0]["att"]
+        if all(item["att"] == first for item in items):
+            return None
+    merged_dict = {}
+    for item in items:
+        sub_k = item["att"]
+        sub_v = item["val"]
+        if sub_k in merged_dict:
+            if isinstance(merged_dict[sub_k], list):
+                merged_dict[sub_k].append(sub_v)
             else:
-                new_obj[att_key] = val_val
+                merged_dict[sub_k] = [merged_dict[sub_k], sub_v]
+        else:
+            merged_dict[sub_k] = sub_v
+    return merged_dict
+
+
+NOT_PAIRS = object()
+
 
-        for k, v in obj.items():
-            if k in ["att", "val"]:
+def close_dict(new_obj, known):
+    feat = new_obj.get("feat")
+    if isinstance(feat, dict):
+        if not any(k in new_obj for k in feat):
+            for k, v in feat.items():
+                new_obj[k] = v
+            del new_obj["feat"]
+
+    if known is not None:
+        for k, v in new_obj.items():
+            if isinstance(v, str) and k not in FREE_TEXT_KEYS:
+                known[k].add(v)
+    return new_obj
+
+
+def simplify(obj, path="root", known=known_values):
+    """Fold att/val pairs into keys and feat lists into their parents.
+
+    Values of keys that are not free text are collected into known, pass None to skip that.
+    The path of a node is only built when a key collision has to be reported.
+    """
+    if isinstance(obj, dict):
+        stack = [[iter(obj.items()), open_dict(obj, path, []), None]]
+    elif isinstance(obj, list):
+        stack = [[iter(enumerate(obj)), [], None]]
+    else:
+        return obj
+
+    # A frame is [iterator over the children, the dict or list being built, key or index of the open child]
+    while True:
+        frame = stack[-1]
+        iterator, result, _ = frame
+        is_dict = isinstance(result, dict)
+        for k, v in iterator:
+            # list indices never equal these
+            if k == "att" or k == "val":
+                continue
+            if isinstance(v, dict):
+                att_key = v.get("att")
+                # most nodes are a lone att/val pair, those are done without a frame of their own
+                if len(v) == 2 and "val" in v and att_key is not None and att_key not in v and att_key != "feat":
+                    val_val = v["val"]
+                    if known is not None and isinstance(val_val, str) and att_key not in FREE_TEXT_KEYS:
+                        known[att_key].add(val_val)
+                    v = {att_key: val_val}
+                else:
+                    frame[2] = k
+                    stack.append([iter(v.items()), open_dict(v, path, stack), None])
+                    break
+            if isinstance(v, list):
+                if is_dict and (k == "feat" or k == "Lemma"):
+                    merged = merge_pairs(v, known)
+                    if merged is not NOT_PAIRS:
+                        if merged is not None:
+                            result[k] = merged
+                        continue
+                frame[2] = k
+                stack.append([iter(enumerate(v)), [], None])
+                break
+            if is_dict:
+                result[k] = v
+            else:
+                result.append(v)
+        else:
+            # every child is done, hand the result to the parent
+            stack.pop()
+            if is_dict:
+                close_dict(result, known)
+            if not stack:
+                return result
+            _, parent, k = stack[-1]
+            if isinstance(parent, list):
+                parent.append(result)
                 continue
-            simplified_value = simplify(v, path=f"{path}.{k}")
-            if (k == "feat" or k == "Lemma") and isinstance(simplified_value, list):
-                sets_of_keys = [set(item.keys()) for item in simplified_value if isinstance(item, dict)]
-                if len(sets_of_keys) > 0 and len(set.intersection(*sets_of_keys)) > 0:
+            if not is_dict and (k == "feat" or k == "Lemma"):
+                result = merge_items(result)
+                if result is None:
                     continue
-                merged_dict = {}
-                for item in simplified_value:
-                    if isinstance(item, dict):
-                        for sub_k, sub_v in item.items():
-                            if sub_k in merged_dict:
-                                if isinstance(merged_dict[sub_k], list):
-                                    merged_dict[sub_k].append(sub_v)
-                                else:
-                                    merged_dict[sub_k] = [merged_dict[sub_k], sub_v]
-                            else:
-                                merged_dict[sub_k] = sub_v
-                simplified_value = merged_dict
-                
-                
-            new_obj[k] = simplified_value
-
-    
-        if "feat" in new_obj and isinstance(new_obj["feat"], dict):
-            if len(set(new_obj).intersection(set(new_obj["feat"].keys()))) == 0:
-                for k, v in new_obj["feat"].items():
-                    new_obj[k] = v
-                del new_obj["feat"]
-
-        for k,v in new_obj.items():
-            if k not in ["sound", "label", "id", "url", "writtenForm", "variant", "lemma", "definition", "example", "syntacticPattern", "pronunciation", "example", "origin", "annotation"] and isinstance(v, str):
-                known_values[k].add(v)
-        return new_obj
+            parent[k] = result
+
+
+def profile_shapes(obj, shapes, prefix=""):
+    """Add the shapes of every field of a simplified entry to shapes, keyed by the path of the field."""
+    for k, v in obj.items():
+        path = prefix + k
+        if isinstance(v, list):
+            shapes[path].add("list")
+            for item in v:
+                if isinstance(item, dict):
+                    shapes[path].add("dict")
+                    profile_shapes(item, shapes, path + ".")
+                else:
+                    shapes[path].add(type(item).__name__)
+        elif isinstance(v, dict):
+            shapes[path].add("dict")
+            profile_shapes(v, shapes, path + ".")
+        else:
+            shapes[path].add(type(v).__name__)
+
+
+def repeated_fields(shapes):
+    """The fields that are a list anywhere and can be made a list everywhere, and those db.py needs as lists."""
+    return sorted(LIST_FIELDS.union(
+        path for path, kinds in shapes.items()
+        if "list" in kinds and path.rsplit(".", 1)[-1] not in SHAPE_SENSITIVE_KEYS
+    ))
+
+
+def normalize_shapes(obj, repeated, prefix=""):
+    """Turn the single values of repeated fields into lists of one, in place."""
+    for k, v in obj.items():
+        path = prefix + k
+        if isinstance(v, dict):
+            normalize_shapes(v, repeated, path + ".")
+            if path in repeated:
+                obj[k] = [v]
+        elif isinstance(v, list):
+            for item in v:
+                if isinstance(item, dict):
+                    normalize_shapes(item, repeated, path + ".")
+        elif path in repeated:
+            obj[k] = [v]
+    return obj
+
+
+class JsonStream:
+    """Incremental reader over a JSON text file, decoding one value at a time."""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
 
+    def fill(self, size=None):
+        if self.eof:
+            return False
+        if self.pos > len(self.buf) // 2:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(max(size or 0, self.chunk_size))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def next_char(self):
+        c = self.peek()
+        self.pos += 1
+        return c
+
+    def expect(self, c):
+        found = self.next_char()
+        if found != c:
+            raise ValueError(f"Expected '{c}' but found '{found}' at offset {self.pos - 1}")
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # the value runs past the buffer, grow it geometrically and retry
+                if not self.fill(len(self.buf) - self.pos):
+                    raise
+                continue
+            # a number cut off by the end of the buffer might continue in the next chunk
+            if not self.buf[end:].strip("0123456789.eE+-") and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+class EntriesMarker:
+    """Stands in for the streamed LexicalEntry list inside the document skeleton."""
+
+
+def stream_object(stream, path, target):
+    """Parse an object into target, yielding the elements of the list at path instead of storing them."""
+    stream.expect("{")
+    if stream.peek() == "}":
+        stream.next_char()
+        return
+    while True:
+        key = stream.read_value()
+        stream.expect(":")
+        if path and key == path[0] and stream.peek() == ("[" if len(path) == 1 else "{"):
+            if len(path) == 1:
+                target[key] = EntriesMarker()
+                stream.expect("[")
+                if stream.peek() == "]":
+                    stream.next_char()
+                else:
+                    while True:
+                        yield stream.read_value()
+                        if stream.next_char() == "]":
+                            break
+            else:
+                target[key] = {}
+                yield from stream_object(stream, path[1:], target[key])
+        else:
+            target[key] = stream.read_value()
+        if stream.next_char() == "}":
+            return
+
+
+class EntryLinesWriter:
+    """Writes one compact entry per line, and the byte offsets of the lines to an index next to it.
+
+    The index holds the offset of every line and the size of the file as little endian 64 bit
+    integers, so entry n is found by reading 16 bytes at 8 * n.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.f = open(self.path, "wb")
+        self.offsets = array("Q", [0])
+
+    def write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        self.f.write(line)
+        self.offsets.append(self.offsets[-1] + len(line))
+
+    def close(self):
+        self.f.close()
+        if sys.byteorder == "big":
+            self.offsets.byteswap()
+        with open(entry_index_path(self.path), "wb") as f:
+            self.offsets.tofile(f)
+
+
+def entry_lines_path(out_dir, json_file):
+    return out_dir / (Path(json_file).stem + ".jsonl")
+
+
+def entry_index_path(path):
+    return Path(path).with_suffix(".idx")
+
+
+def remove_other_format(out_dir, json_file, lines):
+    """Remove what an earlier run wrote for json_file in the format not written now.
+
+    db.py prefers the entry lines file of a stem, it must not pick up an outdated one.
+    """
+    if lines:
+        (out_dir / Path(json_file).name).unlink(missing_ok=True)
     else:
-        return obj
+        path = entry_lines_path(out_dir, json_file)
+        path.unlink(missing_ok=True)
+        entry_index_path(path).unlink(missing_ok=True)
+
+
+def read_entry_offsets(path):
+    """The offsets of the lines of an entry lines file, followed by its size."""
+    offsets = array("Q")
+    with open(entry_index_path(path), "rb") as f:
+        offsets.frombytes(f.read())
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    return offsets
+
+
+def count_entry_lines(path) -> int:
+    return entry_index_path(path).stat().st_size // 8 - 1
+
+
+def iter_entry_lines(path, start: int = 0, stop: Optional[int] = None):
+    """Yield the entries start to stop (exclusive) of an entry lines file, seeking to the first one."""
+    offset = 0
+    if start:
+        offset = read_entry_offsets(path)[start]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for i, line in enumerate(f, start):
+            if stop is not None and i >= stop:
+                return
+            yield json.loads(line)
+
+
+def read_entry(path, n: int):
+    """Read the nth entry of an entry lines file."""
+    with open(entry_index_path(path), "rb") as f:
+        f.seek(8 * n)
+        offsets = array("Q", f.read(16))
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    if len(offsets) < 2:
+        raise IndexError(f"{path} has no entry {n}")
+    start, end = offsets
+    with open(path, "rb") as f:
+        f.seek(start)
+        return json.loads(f.read(end - start))
+
 
+def simplify_file(json_file, out_dir, report=NO_REPORT, known=known_values, lines=False, repeated=None):
+    start = time.perf_counter()
+    with report.phase("parse"):
+        with open(json_file, encoding="utf-8") as f:
+            data = json.load(f)
+    with report.phase("simplify"):
+        simplified = simplify(data, known=known)
+    entries = simplified.get("LexicalResource", {}).get("Lexicon", {}).get("LexicalEntry", [])
+    if repeated is not None:
+        with report.phase("normalize"):
+            for entry in entries:
+                normalize_shapes(entry, repeated)
+    with report.phase("write"):
+        remove_other_format(out_dir, json_file, lines)
+        if lines:
+            writer = EntryLinesWriter(entry_lines_path(out_dir, json_file))
+            for entry in entries:
+                writer.write(entry)
+            writer.close()
+        else:
+            with open(out_dir / json_file.name, 'w', encoding="utf-8") as f_out:
+                json.dump(simplified, f_out, ensure_ascii=False, indent=2)
+    report.add_file(json_file.name, len(entries), {}, time.perf_counter() - start)
 
-Path("simplified").mkdir(exist_ok=True)
-for json_file in Path('data').glob("*.json"):
-    with open(json_file, encoding="utf-8") as f:
-        data = json.load(f)
-    simplified = simplify(data)
-    with open(Path(f"simplified/{json_file.name}"), 'w', encoding="utf-8") as f_out:
-        json.dump(simplified, f_out, ensure_ascii=False, indent=2)
 
+def iter_simplified_entries(json_file, out_dir=None, report=NO_REPORT, known=known_values, lines=False,
+                            repeated=None):
+    """Simplify a file one entry at a time, yielding each simplified entry.
+
+    The simplified document is written to out_dir once all entries were consumed, unless out_dir is None.
+    With lines, only the entries are written, one per line as they are simplified.
+    With repeated, the fields named in it are always lists (see normalize_shapes).
+    Parsing is not measured here, it happens while the caller asks for the next entry.
+    """
+    if out_dir is not None:
+        remove_other_format(out_dir, json_file, lines)
+    if lines and out_dir is not None:
+        writer = EntryLinesWriter(entry_lines_path(out_dir, json_file))
+        for entry in iter_simplified_entries(json_file, None, report, known, repeated=repeated):
+            yield entry
+            with report.phase("write"):
+                writer.write(entry)
+        writer.close()
+        return
+
+    # Entries are simplified as they are parsed and spooled to a temporary file, the rest of the
+    # document is only known once the whole file has been read (folded feats end up after the entries).
+    skeleton = {}
+    entries_path = "root." + ".".join(ENTRY_PATH)
+    count = 0
+    with open(json_file, encoding="utf-8") as f, tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        for i, entry in enumerate(stream_object(JsonStream(f), ENTRY_PATH, skeleton)):
+            with report.phase("simplify"):
+                entry = simplify(entry, path=f"{entries_path}[{i}]", known=known)
+            if repeated is not None:
+                with report.phase("normalize"):
+                    normalize_shapes(entry, repeated)
+            yield entry
+            if out_dir is None:
+                continue
+            with report.phase("write"):
+                if i > 0:
+                    spool.write(",\n")
+                spool.write(json.dumps(entry, ensure_ascii=False, indent=2))
+            count += 1
+
+        skeleton = simplify(skeleton, known=known)
+        if out_dir is None:
+            return
+        with report.phase("write"):
+            marker = json.dumps("\0entries\0")
+            text = json.dumps(
+                skeleton, ensure_ascii=False, indent=2,
+                default=lambda o: "\0entries\0" if isinstance(o, EntriesMarker) else None
+            )
+            with open(out_dir / json_file.name, 'w', encoding="utf-8") as f_out:
+                if marker not in text:
+                    f_out.write(text)
+                    return
+                head, tail = text.split(marker, 1)
+                if count == 0:
+                    f_out.write(head + "[]" + tail)
+                    return
+                last_line = head[head.rindex("\n") + 1:]
+                indent = "\n" + " " * (len(last_line) - len(last_line.lstrip(" "))) + "  "
+                f_out.write(head + "[" + indent)
+                spool.seek(0)
+                for line in spool:
+                    f_out.write(line.replace("\n", indent))
+                f_out.write(indent[:-2] + "]" + tail)
+
+
+def simplify_file_streaming(json_file, out_dir, report=NO_REPORT, known=known_values, lines=False, repeated=None):
+    start = time.perf_counter()
+    count = 0
+    for _ in timed(iter_simplified_entries(json_file, out_dir, report, known, lines, repeated), report, "parse"):
+        count += 1
+    report.add_file(json_file.name, count, {}, time.perf_counter() - start)
+
+
+def profile_file(json_file):
+    """The shapes of every field of the simplified entries of a file, see profile_shapes."""
+    shapes = defaultdict(set)
+    for entry in iter_simplified_entries(json_file, known=None):
+        profile_shapes(entry, shapes)
+    return shapes
+
+
+def normalized_files(directory):
+    """The names of the simplified files in directory that were written normalized."""
+    path = Path(directory) / SHAPES_FILE
+    if not path.exists():
+        return frozenset()
+    with open(path, encoding="utf-8") as f:
+        return frozenset(json.load(f).get("files", ()))
+
+
+def simplify_job(json_file, out_dir, stream, collect_known=True, lines=False, repeated=None):
+    """Simplify one file in a worker process and hand back the state it collected."""
+    global any_error
+    any_error = False
+    known_values.clear()
+    report = BuildReport()
+    known = known_values if collect_known else None
+    if stream:
+        simplify_file_streaming(json_file, out_dir, report, known, lines, repeated)
+    else:
+        simplify_file(json_file, out_dir, report, known, lines, repeated)
+    return dict(known_values), any_error, report
+
+
+def main():
+    global any_error
+    parser = argparse.ArgumentParser(description="Simplify the krdict json export.")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse one LexicalEntry at a time to bound memory use by the largest entry")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="number of worker processes, each simplifying whole files")
+    parser.add_argument("--no-known-values", action="store_true",
+                        help="skip collecting the values of every key into known_values.json")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="write one compact entry per line to simplified/*.jsonl with a byte offset index in *.idx")
+    parser.add_argument("--normalize", action="store_true",
+                        help="profile the field shapes first and write every field that is ever a list as a list")
+    args = parser.parse_args()
+
+    out_dir = Path("simplified")
+    out_dir.mkdir(exist_ok=True)
+    # removed first, the files are not normalized until the run below completes
+    shapes_path = out_dir / SHAPES_FILE
+    shapes_path.unlink(missing_ok=True)
+    json_files = sorted(Path('data').glob("*.json"))
+    report = BuildReport()
+    shapes = defaultdict(set)
+    repeated = None
+    if args.normalize:
+        with report.phase("profile"):
+            if args.jobs > 1:
+                with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                    file_shapes = list(executor.map(profile_file, json_files))
+            else:
+                file_shapes = map(profile_file, json_files)
+            for file_shape in file_shapes:
+                for path, kinds in file_shape.items():
+                    shapes[path].update(kinds)
+        repeated = frozenset(repeated_fields(shapes))
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            # map keeps the file order, so merged keys appear in the same order as in a serial run
+            results = executor.map(
+                simplify_job, json_files, repeat(out_dir), repeat(args.stream), repeat(not args.no_known_values),
+                repeat(args.jsonl), repeat(repeated)
+            )
+            for values, error, file_report in results:
+                for k, v in values.items():
+                    known_values[k].update(v)
+                any_error = any_error or error
+                report.merge(file_report)
+    else:
+        known = None if args.no_known_values else known_values
+        for json_file in json_files:
+            if args.stream:
+                simplify_file_streaming(json_file, out_dir, report, known, args.jsonl, repeated)
+            else:
+                simplify_file(json_file, out_dir, report, known, args.jsonl, repeated)
+
+    if not any_error:
+        logger.info("All JSON files simplified successfully.")
 
-if not any_error:
-    logger.info("All JSON files simplified successfully.")
+    if not args.no_known_values:
+        with open("known_values.json", "w", encoding="utf-8") as f:
+            json.dump({k: sorted(known_values[k]) for k in sorted(known_values)}, f, indent=2, ensure_ascii=False)
+    if repeated is not None:
+        with open(shapes_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "files": [
+                    entry_lines_path(out_dir, json_file).name if args.jsonl else json_file.name
+                    for json_file in json_files
+                ],
+                "repeated": sorted(repeated),
+                "shapes": {path: sorted(shapes[path]) for path in sorted(shapes)},
+            }, f, indent=2)
+    report.write("simplify_report.json", options=vars(args), errors=any_error)
 
 
-with open("known_values.json", "w", encoding="utf-8") as f:
-    json.dump({k: list(v) for k, v in known_values.items()}, f, indent=2, ensure_ascii=False)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from pathlib import Path
+import argparse
+import json
+import random
+
+from db import language_map, lexical_unit_map, pos_map, semantic_category_map, subject_category_map
+
+# Entries per file, the real export is split the same way
+ENTRIES_PER_FILE = 5000
+
+RELATION_TYPES = ["유의어", "반대말", "참고어", "준말", "본말", "높임말", "낮춤말", "큰말", "작은말", "센말", "여린말"]
+FORM_TYPES = ["활용", "파생어", "준말"]
+LANGUAGES = [language for language in language_map if language != "kor"]
+WORD_UNITS = [unit for unit in lexical_unit_map if unit not in ("속담", "관용구")]
+SUBJECTS = [subject for subject in subject_category_map if "," not in subject]
+PARTS_OF_SPEECH = list(pos_map)
+CATEGORIES = list(semantic_category_map)
+
+
+def feat(**values):
+    """The export stores every value as an att/val pair, several of them as a feat list."""
+    pairs = [{"att": att, "val": val} for att, values in values.items()
+             for val in (values if isinstance(values, list) else [values])]
+    return pairs[0] if len(pairs) == 1 else pairs
+
+
+def one_or_list(items):
+    """A single child is a dict in the export, several are a list."""
+    return items[0] if len(items) == 1 else items
+
+
+class Generator:
+    """Random entries in the shape of the raw krdict json export."""
+
+    def __init__(self, seed: int = 0):
+        self.random = random.Random(seed)
+        self.next_sense_id = 1
+
+    def syllables(self, low: int = 1, high: int = 4) -> str:
+        return "".join(chr(0xAC00 + self.random.randrange(11172)) for _ in range(self.random.randint(low, high)))
+
+    def sentence(self, words: int = 6) -> str:
+        return " ".join(self.syllables() for _ in range(self.random.randint(2, words))) + "."
+
+    def latin(self, words: int = 3) -> str:
+        return " ".join(
+            "".join(self.random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(self.random.randint(2, 9)))
+            for _ in range(self.random.randint(1, words))
+        )
+
+    def sound(self) -> str:
+        return f"https://dicmedia.korean.go.kr/multimedia/sound_file/{self.random.randrange(10 ** 8)}.wav"
+
+    def equivalent(self, language: str):
+        lemmas = [self.latin(2) for _ in range(self.random.randint(1, 3))]
+        return {"feat": feat(language=language, lemma="; ".join(lemmas), definition=self.latin(10))}
+
+    def example(self):
+        type = self.random.choice(["구", "문장", "문장", "대화"])
+        if type == "대화":
+            # several example feats in one list, simplify() folds them into a list of lines
+            return {"feat": feat(type=type, example=[self.sentence() for _ in range(self.random.randint(2, 4))])}
+        return {"feat": feat(type=type, example=self.sentence())}
+
+    def relation(self, max_id: int):
+        values = {"type": self.random.choice(RELATION_TYPES), "lemma": self.syllables(), "homonymNumber": "0"}
+        if self.random.random() < 0.7:
+            values["id"] = str(self.random.randint(1, max_id))
+        return {"feat": feat(**values)}
+
+    def sense(self, max_id: int):
+        sense = {"att": "id", "val": str(self.next_sense_id)}
+        self.next_sense_id += 1
+        values = {"definition": self.sentence(12)}
+        if self.random.random() < 0.1:
+            values["annotation"] = self.sentence(3)
+        if self.random.random() < 0.2:
+            values["syntacticPattern"] = [self.sentence(3) for _ in range(self.random.randint(1, 2))]
+        sense["feat"] = feat(**values)
+        # most senses are translated into every language, some only into a few or one
+        languages = LANGUAGES if self.random.random() < 0.7 else \
+            [language for language in LANGUAGES if self.random.random() < 0.3] or [self.random.choice(LANGUAGES)]
+        sense["Equivalent"] = one_or_list([self.equivalent(language) for language in languages])
+        examples = [self.example() for _ in range(self.random.randint(0, 6))]
+        if examples:
+            sense["SenseExample"] = one_or_list(examples)
+        relations = [self.relation(max_id) for _ in range(self.random.choice([0, 0, 0, 1, 2]))]
+        if relations:
+            sense["SenseRelation"] = one_or_list(relations)
+        if self.random.random() < 0.03:
+            sense["Multimedia"] = {"feat": feat(type=self.random.choice(["사진", "동영상"]), label=self.syllables(),
+                                                url=self.sound())}
+        return sense
+
+    def word_forms(self, written_form: str):
+        pronunciations = [self.syllables() for _ in range(self.random.choice([1, 1, 1, 2]))]
+        forms = [{"feat": feat(type="발음", pronunciation=pronunciations, sound=[self.sound() for _ in pronunciations])}]
+        for _ in range(self.random.choice([0, 0, 1, 3])):
+            form = {"feat": feat(type=self.random.choice(FORM_TYPES), writtenForm=written_form + self.syllables(1, 2))}
+            if self.random.random() < 0.5:
+                form["FormRepresentation"] = {"feat": feat(type="발음", writtenForm=self.syllables(),
+                                                           pronunciation=self.syllables())}
+            forms.append(form)
+        return one_or_list(forms)
+
+    def entry(self, id: int, max_id: int):
+        written_form = self.syllables()
+        phrase = self.random.random() < 0.05
+        if self.random.random() < 0.1:
+            lemma = [{"feat": feat(writtenForm=written_form)}, {"feat": feat(variant=self.syllables())}]
+        else:
+            lemma = {"feat": feat(writtenForm=written_form)}
+        values = {"homonym_number": str(self.random.choice([0, 0, 0, 1, 2]))}
+        if phrase:
+            values["lexicalUnit"] = self.random.choice(["속담", "관용구"])
+        else:
+            values["lexicalUnit"] = self.random.choice(WORD_UNITS)
+            values["partOfSpeech"] = self.random.choice(PARTS_OF_SPEECH)
+        values["vocabularyLevel"] = self.random.choice(["초급", "중급", "고급", "없음", "없음"])
+        if self.random.random() < 0.3:
+            values["semanticCategory"] = f"{self.random.choice(CATEGORIES)} > {self.random.choice(CATEGORIES)}"
+        if self.random.random() < 0.1:
+            values["subjectCategiory"] = ",".join(self.random.sample(SUBJECTS, self.random.randint(1, 2)))
+        entry = {"att": "id", "val": str(id), "Lemma": lemma, "feat": feat(**values)}
+        if not phrase:
+            entry["WordForm"] = self.word_forms(written_form)
+        entry["Sense"] = one_or_list([self.sense(max_id) for _ in range(self.random.choice([1, 1, 1, 2, 3]))])
+        return entry
+
+
+def generate_export(out_dir, entries: int, entries_per_file: int = ENTRIES_PER_FILE, seed: int = 0):
+    """Write entries random entries as export files to out_dir, returns the files in order."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    generator = Generator(seed)
+    files = []
+    for first in range(1, entries + 1, entries_per_file):
+        last = min(first + entries_per_file - 1, entries)
+        document = {"LexicalResource": {"Lexicon": {
+            "feat": {"att": "language", "val": "kor"},
+            "LexicalEntry": [generator.entry(id, entries) for id in range(first, last + 1)],
+        }}}
+        path = out_dir / f"{len(files) + 1}_{first}_{last}.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+        files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic krdict-shaped json export.")
+    parser.add_argument("entries", type=int, help="number of entries to generate")
+    parser.add_argument("--out", type=Path, default=Path("synthetic"), help="directory for the export files")
+    parser.add_argument("--entries-per-file", type=int, default=ENTRIES_PER_FILE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    files = generate_export(args.out, args.entries, args.entries_per_file, args.seed)
+    print(f"Wrote {args.entries} entries to {len(files)} files in {args.out}")
+
+
+if __name__ == "__main__":
+    main()